@@ -0,0 +1,62 @@
+"""
+Test setup for scripts/
+
+ingest_cases.py imports the pipeline components described in
+IMPLEMENTATION_PLAN.md. Any component that isn't importable is replaced by
+a placeholder with the plan's constructor and attributes; the tests supply
+fakes for the methods the pipeline calls.
+"""
+
+import importlib
+import sys
+import types
+
+
+class CourtListenerClient:
+    BASE_URL = "https://www.courtlistener.com/api/rest/v3"
+
+    def __init__(self, api_token: str):
+        self.api_token = api_token
+        self.session = types.SimpleNamespace(headers={'User-Agent': 'LegalRAG/1.0'})
+        self.rate_limit_delay = 0
+        self.last_request_time = 0
+
+
+class CaseLawChunker:
+    def __init__(self, chunk_size: int = 512, chunk_overlap: int = 50, model_name: str = "gpt-4o"):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+
+class AzureEmbeddingService:
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        deployment_name: str = "text-embedding-ada-002",
+        api_version: str = "2024-08-01-preview"
+    ):
+        self.deployment_name = deployment_name
+
+
+class AzureSearchIndexManager:
+    def __init__(self, endpoint: str, api_key: str, index_name: str = "legal-cases-index"):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.index_name = index_name
+
+
+_PLACEHOLDERS = {
+    'courtlistener_client': CourtListenerClient,
+    'case_chunker': CaseLawChunker,
+    'azure_embedding': AzureEmbeddingService,
+    'azure_search_manager': AzureSearchIndexManager,
+}
+
+for module_name, placeholder in _PLACEHOLDERS.items():
+    try:
+        importlib.import_module(module_name)
+    except ImportError:
+        module = types.ModuleType(module_name)
+        setattr(module, placeholder.__name__, placeholder)
+        sys.modules[module_name] = module
@@ -9,9 +9,42 @@ Usage:
 
 import os
 import sys
+import sqlite3
+import tempfile
+import time
 import argparse
-from datetime import datetime
+import asyncio
+import base64
+import gzip
+import random
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+import orjson
+import pyarrow as pa
+import xxhash
 from dotenv import load_dotenv
+from tqdm import tqdm
+from openai import AsyncAzureOpenAI, BadRequestError, RateLimitError
+from azure.search.documents.indexes.models import (
+    SearchIndex,
+    SimpleField,
+    SearchableField,
+    SearchField,
+    SearchFieldDataType,
+    VectorSearch,
+    HnswAlgorithmConfiguration,
+    VectorSearchProfile,
+    ScalarQuantizationCompression,
+    SemanticConfiguration,
+    SemanticPrioritizedFields,
+    SemanticField,
+    SemanticSearch
+)
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +56,973 @@ from azure_embedding import AzureEmbeddingService
 from azure_search_manager import AzureSearchIndexManager
 
 
+# Default embedding deployment
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Native vector size per deployment, used for the index when no smaller
+# (Matryoshka-truncated) size is requested. The docs deploy each model
+# under its own name; other deployment names need --index-dims.
+NATIVE_EMBEDDING_DIMS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+# Chunks per embedding request (the API accepts up to 2048 inputs), further
+# capped by total characters so a run of long chunks can't blow the
+# per-request token limit
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_BATCH_MAX_CHARS = 150_000
+
+# Embedding requests allowed in flight at once
+EMBEDDING_CONCURRENCY = 10
+
+# Retries of a rate-limited (429) embedding batch, on top of the openai
+# client's own, before its chunks count as failed
+EMBEDDING_RETRIES = 5
+
+# Cap (seconds) on the wait between retries: the jittered exponential
+# backoff, and any Retry-After the service sends
+RETRY_BACKOFF_MAX = 30
+
+# Azure OpenAI Batch API: endpoint for embedding requests and how often to
+# poll a submitted batch for completion
+BATCH_EMBEDDINGS_URL = "/v1/embeddings"
+BATCH_POLL_SECONDS = 60
+
+# Batch API input file limits: requests per file, and bytes per file
+# (the service caps files at 200 MB)
+BATCH_MAX_REQUESTS = 50_000
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+
+# Azure AI Search REST API version for direct document uploads
+SEARCH_API_VERSION = "2024-07-01"
+
+# Upload retries for a batch hit by throttling (429/503), a server error
+# (500/502/504) or a transport error, before it counts as failed. Uploads
+# are idempotent ('upload' actions overwrite by key), so resending is safe.
+SEARCH_UPLOAD_RETRIES = 3
+SEARCH_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Per-document statuses in a 207 (multi-status) response worth resending:
+# version conflict (409), index busy (422), throttled (429/503)
+SEARCH_DOCUMENT_RETRY_STATUSES = (409, 422, 429, 503)
+
+# gzip level for upload bodies when --gzip-uploads is on (Content-Encoding:
+# gzip). Chunk text compresses several-fold; higher levels cost CPU for
+# little extra.
+SEARCH_GZIP_LEVEL = 6
+
+# Upload requests in flight: starts at two per search partition, then moves
+# by one (up to the cap) after each window of batches, down if more than 5%
+# needed a retry, up if none did
+SEARCH_UPLOAD_MAX_CONCURRENCY = 8
+SEARCH_UPLOAD_WINDOW = 50
+
+# HNSW graph parameters. Azure AI Search inserts each uploaded vector into
+# the graph as it is indexed; a vector field must name its profile when
+# the index is created and can't be re-pointed later, so graph building
+# can't be deferred to the end of a bulk load. efConstruction is the
+# per-insert cost knob (candidates examined while linking a new vector),
+# efSearch only affects queries.
+HNSW_M = 4
+HNSW_EF_CONSTRUCTION = 400
+HNSW_EF_SEARCH = 500
+
+# Vectors are indexed as FP16 (Edm.Half). Components are rounded to this
+# many decimals before upload: finer than FP16 keeps for typical embedding
+# magnitudes, but far fewer JSON digits than full float32.
+VECTOR_DECIMALS = 5
+
+# Queue bounds between stages, so only a sliding window of opinions and
+# chunks is resident instead of the whole run
+FETCH_QUEUE_SIZE = 100        # opinions (one CourtListener page)
+CHUNK_QUEUE_SIZE = 2 * EMBEDDING_BATCH_SIZE
+UPLOAD_QUEUE_SIZE = EMBEDDING_CONCURRENCY
+
+# Distinct chunk texts whose vectors are kept for reuse by later repeats
+# (court headers, disclaimers, quoted syllabi)
+DEDUP_CACHE_SIZE = 20_000
+
+# Characters compared on a hash match to rule out xxh3 collisions
+DEDUP_PREFIX_CHARS = 64
+
+# chunk_ids per checkpoint lookup (stays under SQLite's bound-parameter limit)
+CHECKPOINT_QUERY_SIZE = 500
+
+# Opinions handed to the chunking processes but not yet finished, per worker
+CHUNK_TASKS_PER_WORKER = 2
+
+# date_filed for opinions CourtListener returns without a filing date
+# (Edm.DateTimeOffset needs a value to sort and filter on)
+MISSING_DATE_FILED = "1900-01-01T00:00:00Z"
+
+# Marks the end of a stage's output on its queue
+_END_OF_STREAM = object()
+
+# failed_chunks reason for a repeat whose identical chunk failed to embed
+_ORPHANED_REPEAT = "identical chunk in the same batch was not embedded"
+
+
+# Chunker owned by a ProcessPoolExecutor worker (set by _init_chunk_worker)
+_worker_chunker: Optional[CaseLawChunker] = None
+
+
+def _init_chunk_worker(chunker: CaseLawChunker):
+    """Install the chunker in a worker process, once per process"""
+    global _worker_chunker
+    _worker_chunker = chunker
+
+
+def _chunk_opinion(opinion: Dict) -> List[Dict]:
+    """Chunk one opinion inside a worker process"""
+    return _worker_chunker.process_opinion(opinion)
+
+
+def _report_failures(action: str, failures: List, limit: int = 5):
+    """Print one end-of-phase line for a stage's failures, with a few examples"""
+    tqdm.write(f"      ⚠ Failed to {action} {len(failures)}")
+    for item_id, error in failures[:limit]:
+        tqdm.write(f"        - {item_id}: {error}")
+    if len(failures) > limit:
+        tqdm.write(f"        ... and {len(failures) - limit} more")
+
+
+def _progress_bar(desc: str, unit: str, total: Optional[int] = None) -> tqdm:
+    """Stage progress bar; tqdm redraws at most ~10 times a second"""
+    return tqdm(desc=f"      {desc:<10}", unit=unit, total=total, leave=True)
+
+
+def _leaf_exceptions(group: BaseExceptionGroup) -> List[BaseException]:
+    """Flatten a (possibly nested) exception group into its leaf exceptions"""
+    leaves = []
+    for e in group.exceptions:
+        if isinstance(e, BaseExceptionGroup):
+            leaves.extend(_leaf_exceptions(e))
+        else:
+            leaves.append(e)
+    return leaves
+
+
+@dataclass(slots=True)
+class SearchDoc:
+    """One chunk in the Azure AI Search index schema"""
+    
+    id: str
+    case_id: str
+    case_name: str
+    citation: str
+    court: str
+    date_filed: str
+    jurisdiction: str
+    content: str
+    content_vector: np.ndarray
+    url: str
+    chunk_index: int
+    total_chunks: int
+    
+    @classmethod
+    def from_chunk(cls, chunk: Dict, content_vector: np.ndarray) -> 'SearchDoc':
+        """Build a document from a chunker chunk and its embedding"""
+        return cls(
+            id=chunk['chunk_id'],
+            case_id=str(chunk['case_id']),
+            case_name=chunk['case_name'],
+            citation=chunk['citation'],
+            court=chunk['court'],
+            date_filed=chunk.get('date_filed') or MISSING_DATE_FILED,
+            jurisdiction=chunk['jurisdiction'],
+            content=chunk['content'],
+            content_vector=content_vector,
+            url=chunk['url'],
+            chunk_index=chunk['chunk_index'],
+            total_chunks=chunk['total_chunks']
+        )
+    
+    @staticmethod
+    def to_record_batch(docs: List['SearchDoc']) -> pa.RecordBatch:
+        """
+        Stage documents column-wise for upload
+        
+        Each field becomes one Arrow column and the vectors one contiguous
+        FixedSizeList[float32] column, so a queued batch is a handful of
+        buffers rather than a Python object per field per document.
+        """
+        columns = {
+            field.name: [getattr(doc, field.name) for doc in docs]
+            for field in fields(SearchDoc) if field.name != 'content_vector'
+        }
+        vectors = np.stack([doc.content_vector for doc in docs])
+        columns['content_vector'] = pa.FixedSizeListArray.from_arrays(
+            pa.array(vectors.ravel()), vectors.shape[1]
+        )
+        return pa.RecordBatch.from_pydict(columns)
+
+
+def _upload_body(batch: pa.RecordBatch, compress: bool = False) -> bytes:
+    """Serialize a staged batch as a docs/index request body, gzipped if asked"""
+    documents = batch.drop_columns(['content_vector']).to_pylist()
+    # Row views into the vector column's buffer; no per-document copies
+    vectors = batch.column('content_vector').flatten().to_numpy().reshape(len(batch), -1)
+    for document, vector in zip(documents, vectors):
+        document['@search.action'] = 'upload'
+        document['content_vector'] = vector
+    body = orjson.dumps({'value': documents}, option=orjson.OPT_SERIALIZE_NUMPY)
+    return gzip.compress(body, compresslevel=SEARCH_GZIP_LEVEL) if compress else body
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before a retry: Retry-After if sent, else jittered backoff"""
+    if response is not None:
+        try:
+            return min(RETRY_BACKOFF_MAX, float(response.headers.get('retry-after')))
+        except (TypeError, ValueError):
+            pass
+    return min(RETRY_BACKOFF_MAX, 2 ** attempt + random.random())
+
+
+def _is_context_length_error(error: BadRequestError) -> bool:
+    """Whether a 400 means some input is over the model's token limit"""
+    return error.code == 'context_length_exceeded' or 'maximum context length' in str(error)
+
+
+def _decode_vector(embedding: str) -> np.ndarray:
+    """Decode a base64 embedding into float32, rounded for upload"""
+    vector = np.frombuffer(base64.b64decode(embedding), dtype=np.float32)
+    return np.round(vector, VECTOR_DECIMALS)
+
+
+def _content_hash(content: str) -> int:
+    """64-bit xxh3 hash of a chunk's text"""
+    return xxhash.xxh3_64_intdigest(content.encode('utf-8'))
+
+
+class ChunkDeduplicator:
+    """Embed each distinct chunk text once and fan its vector out to repeats"""
+    
+    def __init__(self, max_vectors: int = DEDUP_CACHE_SIZE):
+        self.max_vectors = max_vectors
+        self.reused = 0
+        # xxh3 hash -> (content prefix, vector), least recently used first
+        self._vectors: OrderedDict = OrderedDict()
+    
+    def split(self, chunks: List[Dict]) -> Tuple[List[Dict], List[SearchDoc], Dict[int, List[Dict]]]:
+        """
+        Separate the chunks that still need an embedding
+        
+        Args:
+            chunks: List of chunk dictionaries
+            
+        Returns:
+            (to_embed, reused, repeats): representative chunks to send,
+            SearchDocs built from already-known vectors, and the in-batch
+            repeats of each representative keyed by content hash
+        """
+        to_embed, reused = [], []
+        repeats: Dict[int, List[Dict]] = {}
+        prefixes: Dict[int, str] = {}
+        
+        for chunk in chunks:
+            content = chunk['content']
+            key = _content_hash(content)
+            prefix = content[:DEDUP_PREFIX_CHARS]
+            
+            cached = self._vectors.get(key)
+            if cached is not None and cached[0] == prefix:
+                self._vectors.move_to_end(key)
+                reused.append(SearchDoc.from_chunk(chunk, cached[1]))
+            elif key in repeats and prefixes[key] == prefix:
+                repeats[key].append(chunk)
+            else:
+                if key not in repeats:
+                    repeats[key] = []
+                    prefixes[key] = prefix
+                to_embed.append(chunk)
+        
+        self.reused += len(reused)
+        return to_embed, reused, repeats
+    
+    def fan_out(
+        self,
+        embedded: List[SearchDoc],
+        repeats: Dict[int, List[Dict]]
+    ) -> Tuple[List[SearchDoc], List[Dict]]:
+        """
+        Remember new vectors and build SearchDocs for their in-batch repeats
+        
+        Args:
+            embedded: SearchDocs for the representative chunks
+            repeats: Repeats returned by split()
+            
+        Returns:
+            (docs, orphans): SearchDocs for the repeats, and the repeats
+            whose representative was not embedded
+        """
+        docs = []
+        for doc in embedded:
+            key = _content_hash(doc.content)
+            self._vectors[key] = (doc.content[:DEDUP_PREFIX_CHARS], doc.content_vector)
+            self._vectors.move_to_end(key)
+            for chunk in repeats.pop(key, ()):
+                docs.append(SearchDoc.from_chunk(chunk, doc.content_vector))
+        
+        while len(self._vectors) > self.max_vectors:
+            self._vectors.popitem(last=False)
+        
+        self.reused += len(docs)
+        return docs, [chunk for group in repeats.values() for chunk in group]
+
+
+class EmbeddingCheckpoint:
+    """
+    SQLite store of vectors already embedded, keyed by chunk_id
+    
+    Every batch is committed as soon as it is embedded, so an interrupted
+    ingest rerun with the same database only pays for the chunks it never
+    reached. Vectors are kept as FP16 blobs, the precision the index stores.
+    """
+    
+    def __init__(self, path: str, model: str):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            model: Embedding model and dimensions the vectors belong to
+        """
+        self.path = path
+        self.model = model
+        # Chunks served from the store (counted by the embedding service)
+        self.hits = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "model TEXT NOT NULL, chunk_id TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, chunk_id)) WITHOUT ROWID"
+        )
+        # Batch API jobs, so an interrupted run can collect instead of resubmit
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            "batch_id TEXT PRIMARY KEY, model TEXT NOT NULL, status TEXT NOT NULL)"
+        )
+        self._db.commit()
+    
+    def load(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Return the stored vectors for whichever of chunk_ids are present"""
+        vectors = {}
+        for i in range(0, len(chunk_ids), CHECKPOINT_QUERY_SIZE):
+            ids = chunk_ids[i:i + CHECKPOINT_QUERY_SIZE]
+            rows = self._db.execute(
+                f"SELECT chunk_id, vector FROM vectors "
+                f"WHERE model = ? AND chunk_id IN ({','.join('?' * len(ids))})",
+                [self.model, *ids]
+            )
+            for chunk_id, blob in rows:
+                # Rounded like a fresh embedding, or the upcast FP16 values
+                # serialize with full float32 digits
+                vector = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+                vectors[chunk_id] = np.round(vector, VECTOR_DECIMALS)
+        return vectors
+    
+    def save(self, vectors: Dict[str, np.ndarray]):
+        """Store newly embedded vectors and commit"""
+        self._db.executemany(
+            "INSERT OR REPLACE INTO vectors (model, chunk_id, vector) VALUES (?, ?, ?)",
+            [
+                (self.model, chunk_id, vector.astype(np.float16).tobytes())
+                for chunk_id, vector in vectors.items()
+            ]
+        )
+        self._db.commit()
+    
+    def add_batch(self, batch_id: str):
+        """Record a submitted Batch API job"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO batches (batch_id, model, status) VALUES (?, ?, 'submitted')",
+            (batch_id, self.model)
+        )
+        self._db.commit()
+    
+    def open_batches(self) -> List[str]:
+        """Ids of submitted jobs whose results haven't been collected"""
+        rows = self._db.execute(
+            "SELECT batch_id FROM batches WHERE model = ? AND status = 'submitted'",
+            (self.model,)
+        )
+        return [batch_id for (batch_id,) in rows]
+    
+    def close_batch(self, batch_id: str, status: str):
+        """Mark a job collected, with its final status"""
+        self._db.execute("UPDATE batches SET status = ? WHERE batch_id = ?", (status, batch_id))
+        self._db.commit()
+    
+    def close(self):
+        self._db.close()
+
+
+class AdaptiveUploadLimit:
+    """Semaphore-like gate whose size follows the upload retry rate"""
+    
+    def __init__(
+        self,
+        initial: int,
+        maximum: int = SEARCH_UPLOAD_MAX_CONCURRENCY,
+        window: int = SEARCH_UPLOAD_WINDOW
+    ):
+        self.limit = max(1, min(initial, maximum))
+        self.maximum = maximum
+        self._in_flight = 0
+        self._results: deque = deque(maxlen=window)
+        self._changed = asyncio.Condition()
+    
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+    
+    async def release(self):
+        async with self._changed:
+            self._in_flight -= 1
+            self._changed.notify_all()
+    
+    async def record(self, success: bool):
+        """Count one finished batch and resize once a full window is in"""
+        self._results.append(success)
+        if len(self._results) < self._results.maxlen:
+            return
+        
+        rate = sum(self._results) / len(self._results)
+        if rate < 0.95 and self.limit > 1:
+            self.limit -= 1
+        elif rate == 1 and self.limit < self.maximum:
+            self.limit += 1
+        else:
+            return
+        
+        # Judge the new limit on batches sent under it
+        self._results.clear()
+        async with self._changed:
+            self._changed.notify_all()
+
+
+class StreamingCourtListenerClient(CourtListenerClient):
+    """CourtListenerClient that streams opinions over a shared async HTTP client"""
+    
+    def __init__(self, api_token: str, http_client: httpx.AsyncClient):
+        """
+        Args:
+            api_token: Your CourtListener API token
+            http_client: Shared pipeline HTTP client
+        """
+        super().__init__(api_token)
+        self.http_client = http_client
+    
+    async def _search_opinions_async(self, court: str, filed_after: str, page: int) -> Dict:
+        """Async search_opinions for one page of 100, with the same rate limit"""
+        elapsed = time.time() - self.last_request_time
+        if elapsed < self.rate_limit_delay:
+            await asyncio.sleep(self.rate_limit_delay - elapsed)
+        self.last_request_time = time.time()
+        
+        response = await self.http_client.get(
+            f"{self.BASE_URL}/opinions/",
+            params={
+                'court': court,
+                'filed_after': filed_after,
+                'page': page,
+                'page_size': 100  # API max is 100
+            },
+            headers={
+                'Authorization': f'Token {self.api_token}',
+                'User-Agent': self.session.headers.get('User-Agent', 'LegalRAG/1.0')
+            },
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def aiter_opinions(
+        self,
+        court: str,
+        filed_after: str,
+        max_cases: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield opinions page by page
+        
+        Same paging as fetch_all_opinions_paginated, but only the current
+        page is held in memory.
+        
+        Args:
+            court: Court identifier
+            filed_after: Start date (YYYY-MM-DD)
+            max_cases: Maximum number of cases to yield (None = all)
+            
+        Yields:
+            Opinion dictionaries
+        """
+        page = 1
+        fetched = 0
+        
+        while max_cases is None or fetched < max_cases:
+            result = await self._search_opinions_async(court, filed_after, page)
+            
+            opinions = result.get('results', [])
+            if not opinions:
+                break  # No more results
+            
+            if max_cases is not None:
+                opinions = opinions[:max_cases - fetched]
+            
+            for opinion in opinions:
+                fetched += 1
+                yield opinion
+            
+            if not result.get('next'):
+                break
+            
+            page += 1
+
+
+class AsyncAzureEmbeddingService(AzureEmbeddingService):
+    """AzureEmbeddingService with a non-blocking batched embeddings call"""
+    
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        embedding_model: str = EMBEDDING_MODEL,
+        embedding_dims: Optional[int] = None,
+        api_version: str = "2024-08-01-preview",
+        http_client: Optional[httpx.AsyncClient] = None,
+        checkpoint: Optional[EmbeddingCheckpoint] = None
+    ):
+        """
+        Args:
+            endpoint: Azure OpenAI endpoint URL
+            api_key: Azure OpenAI API key
+            embedding_model: Embedding deployment name
+            embedding_dims: Output dimensions (text-embedding-3 models
+                only; None sends the model's native size)
+            api_version: API version
+            http_client: Shared pipeline HTTP client for async calls
+            checkpoint: Store consulted before, and updated after, each
+                embedding call
+        """
+        super().__init__(
+            endpoint=endpoint,
+            api_key=api_key,
+            deployment_name=embedding_model,
+            api_version=api_version
+        )
+        self.embedding_dims = embedding_dims
+        self.checkpoint = checkpoint
+        self.async_client = AsyncAzureOpenAI(
+            api_key=api_key,
+            api_version=api_version,
+            azure_endpoint=endpoint,
+            http_client=http_client
+        )
+    
+    def _checkpointed(self, chunks: List[Dict]) -> Tuple[Dict[str, np.ndarray], List[Dict]]:
+        """Split chunks into checkpointed vectors and chunks still to embed"""
+        if not self.checkpoint:
+            return {}, chunks
+        vectors = self.checkpoint.load([chunk['chunk_id'] for chunk in chunks])
+        return vectors, [chunk for chunk in chunks if chunk['chunk_id'] not in vectors]
+    
+    async def embed_chunks_async(self, chunks: List[Dict]) -> List[SearchDoc]:
+        """
+        Embed a batch of chunks with a single embeddings request
+        
+        Args:
+            chunks: List of chunk dictionaries
+            
+        Returns:
+            Upload-ready SearchDocs, in input order
+        """
+        vectors, pending = self._checkpointed(chunks)
+        
+        if pending:
+            # base64 skips JSON float parsing; vectors stay float32 arrays
+            # all the way to the upload body
+            dims = {'dimensions': self.embedding_dims} if self.embedding_dims else {}
+            response = await self.async_client.embeddings.create(
+                input=[chunk['content'] for chunk in pending],
+                model=self.deployment_name,
+                encoding_format="base64",
+                **dims
+            )
+            
+            embedded = {
+                pending[item.index]['chunk_id']: _decode_vector(item.embedding)
+                for item in response.data
+            }
+            if self.checkpoint:
+                self.checkpoint.save(embedded)
+            vectors.update(embedded)
+        
+        if self.checkpoint:
+            self.checkpoint.hits += len(chunks) - len(pending)
+        
+        return [
+            SearchDoc.from_chunk(chunk, vectors[chunk['chunk_id']])
+            for chunk in chunks
+        ]
+    
+    async def embed_chunks_batch_api(self, chunks: List[Dict]) -> Tuple[List[SearchDoc], List[Tuple[str, str]]]:
+        """
+        Embed chunks through the Azure OpenAI Batch API
+        
+        Writes one embeddings request per chunk to JSONL files kept under
+        the Batch API's per-file limits, submits each as a batch (24h
+        completion window, about half the price of online calls), polls
+        until they finish and maps each result back to its chunk by
+        custom_id. Meant for large offline backfills.
+        
+        With a checkpoint, submitted batch ids are recorded as soon as they
+        exist; batches left open by an interrupted run are collected first,
+        so a rerun doesn't pay for them again.
+        
+        Args:
+            chunks: List of chunk dictionaries
+            
+        Returns:
+            (docs, failures): SearchDocs for every chunk that came back
+            with an embedding, and (chunk_id, error) for those that didn't
+        """
+        async def collect_resumed(batch_id):
+            try:
+                await self._collect_batch(batch_id)
+            except RuntimeError as e:
+                tqdm.write(f"      ⚠ {e}; its chunks will be resubmitted")
+        
+        if self.checkpoint:
+            resumed = self.checkpoint.open_batches()
+            if resumed:
+                tqdm.write(f"      Collecting {len(resumed)} batches from the checkpoint")
+                async with asyncio.TaskGroup() as jobs:
+                    for batch_id in resumed:
+                        jobs.create_task(collect_resumed(batch_id))
+        
+        vectors, pending = self._checkpointed(chunks)
+        errors: Dict[str, str] = {}
+        
+        if pending:
+            async with asyncio.TaskGroup() as jobs:
+                runs = [
+                    jobs.create_task(self._run_embedding_batch(part))
+                    for part in self._split_batch(pending)
+                ]
+            for run in runs:
+                found, failed = run.result()
+                vectors.update(found)
+                errors.update(failed)
+        
+        if self.checkpoint:
+            self.checkpoint.hits += len(chunks) - len(pending)
+        
+        docs, failures = [], []
+        for chunk in chunks:
+            chunk_id = chunk['chunk_id']
+            if chunk_id in vectors:
+                docs.append(SearchDoc.from_chunk(chunk, vectors[chunk_id]))
+            else:
+                failures.append((chunk_id, errors.get(chunk_id, "no result in batch output")))
+        return docs, failures
+    
+    def _batch_request(self, chunk: Dict) -> bytes:
+        """One chunk as a JSONL line of the Batch API input file"""
+        body = {'model': self.deployment_name, 'encoding_format': 'base64', 'input': chunk['content']}
+        if self.embedding_dims:
+            body['dimensions'] = self.embedding_dims
+        return orjson.dumps({
+            'custom_id': chunk['chunk_id'],
+            'method': 'POST',
+            'url': BATCH_EMBEDDINGS_URL,
+            'body': body
+        }) + b'\n'
+    
+    def _split_batch(self, chunks: List[Dict]) -> List[List[Dict]]:
+        """Group chunks into input files within the Batch API limits"""
+        parts, part, size = [], [], 0
+        for chunk in chunks:
+            line_size = len(self._batch_request(chunk))
+            if part and (len(part) == BATCH_MAX_REQUESTS or size + line_size > BATCH_MAX_BYTES):
+                parts.append(part)
+                part, size = [], 0
+            part.append(chunk)
+            size += line_size
+        
+        if part:
+            parts.append(part)
+        return parts
+    
+    async def _run_embedding_batch(self, chunks: List[Dict]) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+        """Submit chunks as one batch and return (vectors, errors) by chunk_id"""
+        # Each job writes its own input file, which is deleted once uploaded
+        # (or if this job or a sibling fails first)
+        with tempfile.NamedTemporaryFile('w+b', suffix='.jsonl') as requests_file:
+            for chunk in chunks:
+                requests_file.write(self._batch_request(chunk))
+            requests_file.seek(0)
+            input_file = await self.async_client.files.create(file=requests_file, purpose="batch")
+        
+        batch = await self.async_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_EMBEDDINGS_URL,
+            completion_window="24h"
+        )
+        if self.checkpoint:
+            self.checkpoint.add_batch(batch.id)
+        tqdm.write(f"      Submitted batch {batch.id} ({len(chunks)} requests)")
+        
+        try:
+            return await self._collect_batch(batch.id)
+        except RuntimeError as e:
+            return {}, {chunk['chunk_id']: str(e) for chunk in chunks}
+    
+    async def _collect_batch(self, batch_id: str) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+        """
+        Poll a batch until it finishes and read its results
+        
+        Vectors are saved to the checkpoint, if any, and the batch is marked
+        closed there. Raises RuntimeError if the batch did not complete.
+        """
+        batch = await self.async_client.batches.retrieve(batch_id)
+        status = batch.status
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await self.async_client.batches.retrieve(batch_id)
+            if batch.status != status:
+                status = batch.status
+                tqdm.write(f"      Batch {batch_id}: {status}")
+        
+        if batch.status != 'completed':
+            if self.checkpoint:
+                self.checkpoint.close_batch(batch_id, batch.status)
+            raise RuntimeError(f"Embedding batch {batch_id} ended with status '{batch.status}'")
+        
+        vectors, errors = {}, {}
+        for file_id in (batch.output_file_id, getattr(batch, 'error_file_id', None)):
+            if not file_id:
+                continue
+            output = await self.async_client.files.content(file_id)
+            for line in output.read().splitlines():
+                result = orjson.loads(line)
+                response = result.get('response') or {}
+                if response.get('status_code') == 200:
+                    vectors[result['custom_id']] = _decode_vector(response['body']['data'][0]['embedding'])
+                else:
+                    error = (response.get('body') or {}).get('error') or result.get('error') or {}
+                    errors[result['custom_id']] = error.get('message') or f"status {response.get('status_code')}"
+        
+        if self.checkpoint:
+            self.checkpoint.save(vectors)
+            self.checkpoint.close_batch(batch_id, batch.status)
+        return vectors, errors
+
+
+class BulkSearchIndexManager(AzureSearchIndexManager):
+    """AzureSearchIndexManager that posts orjson-encoded batches to the index"""
+    
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        index_name: str = "legal-cases-index",
+        vector_dimensions: int = NATIVE_EMBEDDING_DIMS[EMBEDDING_MODEL],
+        http_client: Optional[httpx.AsyncClient] = None,
+        gzip_uploads: bool = False
+    ):
+        super().__init__(endpoint=endpoint, api_key=api_key, index_name=index_name)
+        self.vector_dimensions = vector_dimensions
+        self.http_client = http_client
+        self.gzip_uploads = gzip_uploads
+    
+    def create_index(self) -> SearchIndex:
+        """
+        Create the legal cases index with FP16 vector storage
+        
+        Same schema as AzureSearchIndexManager.create_index, except
+        content_vector is Collection(Edm.Half) and the vector profile
+        applies scalar (int8) quantization to the HNSW graph.
+        
+        Returns:
+            Created SearchIndex object
+        """
+        fields = [
+            SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True),
+            SearchableField(name="case_name", type=SearchFieldDataType.String, filterable=True, sortable=True),
+            SearchableField(name="citation", type=SearchFieldDataType.String, filterable=True, facetable=True),
+            SearchableField(name="court", type=SearchFieldDataType.String, filterable=True, facetable=True),
+            SimpleField(name="date_filed", type=SearchFieldDataType.DateTimeOffset, filterable=True, sortable=True),
+            SearchableField(name="jurisdiction", type=SearchFieldDataType.String, filterable=True, facetable=True),
+            SearchableField(name="content", type=SearchFieldDataType.String, analyzer_name="en.microsoft"),
+            SearchField(
+                name="content_vector",
+                type="Collection(Edm.Half)",
+                searchable=True,
+                vector_search_dimensions=self.vector_dimensions,
+                vector_search_profile_name="legal-vector-profile"
+            ),
+            SimpleField(name="url", type=SearchFieldDataType.String, filterable=False),
+            SimpleField(name="chunk_index", type=SearchFieldDataType.Int32, filterable=True),
+            SimpleField(name="total_chunks", type=SearchFieldDataType.Int32, filterable=True),
+            SimpleField(name="case_id", type=SearchFieldDataType.String, filterable=True)
+        ]
+        
+        vector_search = VectorSearch(
+            algorithms=[
+                HnswAlgorithmConfiguration(
+                    name="legal-hnsw-algorithm",
+                    parameters={
+                        "m": HNSW_M,
+                        "efConstruction": HNSW_EF_CONSTRUCTION,
+                        "efSearch": HNSW_EF_SEARCH,
+                        "metric": "cosine"
+                    }
+                )
+            ],
+            compressions=[
+                ScalarQuantizationCompression(compression_name="legal-sq-compression")
+            ],
+            profiles=[
+                VectorSearchProfile(
+                    name="legal-vector-profile",
+                    algorithm_configuration_name="legal-hnsw-algorithm",
+                    compression_name="legal-sq-compression"
+                )
+            ]
+        )
+        
+        semantic_search = SemanticSearch(
+            configurations=[
+                SemanticConfiguration(
+                    name="legal-semantic-config",
+                    prioritized_fields=SemanticPrioritizedFields(
+                        title_field=SemanticField(field_name="case_name"),
+                        content_fields=[SemanticField(field_name="content")],
+                        keywords_fields=[
+                            SemanticField(field_name="citation"),
+                            SemanticField(field_name="court")
+                        ]
+                    )
+                )
+            ]
+        )
+        
+        index = SearchIndex(
+            name=self.index_name,
+            fields=fields,
+            vector_search=vector_search,
+            semantic_search=semantic_search
+        )
+        
+        result = self.index_client.create_or_update_index(index)
+        print(f"Index '{self.index_name}' created successfully")
+        return result
+    
+    async def upload_batch_async(self, documents: pa.RecordBatch) -> Dict:
+        """
+        Upload one batch of documents
+        
+        Rows are turned into dicts only here, and the body is serialized
+        with orjson, which writes the float32 vectors straight from the
+        Arrow buffer instead of formatting Python floats, off the event
+        loop (and gzipped there when gzip_uploads is set). It is posted to
+        the docs/index REST endpoint on the shared HTTP client.
+        
+        Throttled (429/503) and server-error (500/502/504) responses and
+        transport errors are retried, waiting for Retry-After when the
+        service sends one and with jittered exponential backoff otherwise;
+        a batch rejected as too large (413) is split in half. Documents a
+        207 reports as throttled or conflicting are resent on their own
+        with the same backoff.
+        
+        Args:
+            documents: Batch staged by SearchDoc.to_record_batch
+            
+        Returns:
+            Dict with the 'uploaded' count, 'failures' ((key, error) for
+            each document the index rejected) and 'retries' (requests
+            that had to be repeated, whole or in part)
+        """
+        uploaded = retries = 0
+        failures = []
+        for attempt in range(SEARCH_UPLOAD_RETRIES + 1):
+            response, resent = await self._post_documents(documents)
+            retries += resent
+            
+            if response.status_code == 413 and len(documents) > 1:
+                # Slices share the parent batch's buffers
+                middle = len(documents) // 2
+                first = await self.upload_batch_async(documents.slice(0, middle))
+                second = await self.upload_batch_async(documents.slice(middle))
+                return {
+                    'uploaded': uploaded + first['uploaded'] + second['uploaded'],
+                    'failures': failures + first['failures'] + second['failures'],
+                    'retries': retries + first['retries'] + second['retries']
+                }
+            
+            response.raise_for_status()
+            
+            # 200 or 207 (multi-status): one result per document
+            pending = set()
+            for result in orjson.loads(response.content)['value']:
+                if result['status']:
+                    uploaded += 1
+                elif (result.get('statusCode') in SEARCH_DOCUMENT_RETRY_STATUSES
+                      and attempt < SEARCH_UPLOAD_RETRIES):
+                    pending.add(result['key'])
+                else:
+                    failures.append((result['key'], result.get('errorMessage')))
+            
+            if not pending:
+                break
+            retries += 1
+            await asyncio.sleep(_retry_delay(attempt))
+            ids = documents.column('id').to_pylist()
+            documents = documents.take([i for i, key in enumerate(ids) if key in pending])
+        
+        return {'uploaded': uploaded, 'failures': failures, 'retries': retries}
+    
+    async def _post_documents(self, documents: pa.RecordBatch) -> Tuple[httpx.Response, int]:
+        """
+        POST one batch, retrying whole-request throttling and server errors
+        
+        Returns:
+            (response, retries): the last response, and how many requests
+            were repeated to get it
+        """
+        body = await asyncio.to_thread(_upload_body, documents, self.gzip_uploads)
+        headers = {'api-key': self.api_key, 'Content-Type': 'application/json'}
+        if self.gzip_uploads:
+            headers['Content-Encoding'] = 'gzip'
+        
+        retries = 0
+        for attempt in range(SEARCH_UPLOAD_RETRIES + 1):
+            try:
+                response = await self.http_client.post(
+                    f"{self.endpoint.rstrip('/')}/indexes('{self.index_name}')/docs/search.index",
+                    params={'api-version': SEARCH_API_VERSION},
+                    headers=headers,
+                    content=body
+                )
+            except httpx.TransportError:
+                if attempt == SEARCH_UPLOAD_RETRIES:
+                    raise
+                delay = _retry_delay(attempt)
+            else:
+                if response.status_code not in SEARCH_RETRY_STATUSES or attempt == SEARCH_UPLOAD_RETRIES:
+                    break
+                delay = _retry_delay(attempt, response)
+            retries += 1
+            await asyncio.sleep(delay)
+        
+        return response, retries
+
+
 class LegalCaseIngestionPipeline:
     """Complete pipeline for ingesting cases into Azure AI Search"""
     
@@ -33,22 +1033,70 @@ class LegalCaseIngestionPipeline:
         azure_search_api_key: str,
         azure_openai_endpoint: str,
         azure_openai_api_key: str,
-        index_name: str = "legal-cases-index"
+        index_name: str = "legal-cases-index",
+        embedding_model: str = EMBEDDING_MODEL,
+        embedding_dims: Optional[int] = None,
+        index_dims: Optional[int] = None,
+        checkpoint_db: Optional[str] = None,
+        search_partitions: int = 1,
+        gzip_uploads: bool = False
     ):
-        """Initialize all components"""
+        """
+        Initialize all components
+        
+        embedding_dims is sent to the embeddings API as `dimensions` (None
+        leaves it out, which ada-002 requires). The index vector size is
+        index_dims if given, else embedding_dims, else the deployment's
+        native size; index_dims and embedding_dims must agree when both
+        are given.
+        """
         print("Initializing ingestion pipeline...")
         
-        self.courtlistener = CourtListenerClient(courtlistener_api_token)
+        if index_dims and embedding_dims and index_dims != embedding_dims:
+            raise ValueError(
+                f"--index-dims {index_dims} doesn't match --embedding-dims {embedding_dims}; "
+                f"the index must store vectors of the size they are embedded at"
+            )
+        vector_dimensions = index_dims or embedding_dims or NATIVE_EMBEDDING_DIMS.get(embedding_model)
+        if not vector_dimensions:
+            raise ValueError(
+                f"Unknown native dimensions for deployment '{embedding_model}'; "
+                f"pass --index-dims (or --embedding-dims)"
+            )
+        
+        # One connection pool (HTTP/2, keep-alive) shared by CourtListener,
+        # Azure OpenAI and Azure AI Search calls
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=60,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+        
+        self.courtlistener = StreamingCourtListenerClient(courtlistener_api_token, http_client=self._http)
+        # No tokenizer cache: the chunker encodes each opinion once and cuts
+        # the overlapping windows from that one token list
         self.chunker = CaseLawChunker(chunk_size=512, chunk_overlap=50)
-        self.embedding_service = AzureEmbeddingService(
+        self.checkpoint = (
+            EmbeddingCheckpoint(checkpoint_db, model=f"{embedding_model}/{vector_dimensions}")
+            if checkpoint_db else None
+        )
+        self.embedding_service = AsyncAzureEmbeddingService(
             endpoint=azure_openai_endpoint,
-            api_key=azure_openai_api_key
+            api_key=azure_openai_api_key,
+            embedding_model=embedding_model,
+            embedding_dims=embedding_dims,
+            http_client=self._http,
+            checkpoint=self.checkpoint
         )
-        self.index_manager = AzureSearchIndexManager(
+        self.index_manager = BulkSearchIndexManager(
             endpoint=azure_search_endpoint,
             api_key=azure_search_api_key,
-            index_name=index_name
+            index_name=index_name,
+            vector_dimensions=vector_dimensions,
+            http_client=self._http,
+            gzip_uploads=gzip_uploads
         )
+        self.search_partitions = search_partitions
         
         print("✓ Pipeline initialized\n")
     
@@ -66,21 +1114,95 @@ class LegalCaseIngestionPipeline:
         self.index_manager.create_index()
         print("✓ Index ready\n")
     
-    def ingest_cases(
+    async def aclose(self):
+        """Close the shared HTTP client and the checkpoint database"""
+        await self._http.aclose()
+        if self.checkpoint:
+            self.checkpoint.close()
+    
+    @staticmethod
+    async def _aiter_adaptive_batches(
+        queue: asyncio.Queue,
+        max_chars: int = EMBEDDING_BATCH_MAX_CHARS,
+        max_items: int = EMBEDDING_BATCH_SIZE
+    ):
+        """
+        Group chunks from a queue into embedding batches
+        
+        A batch is closed when adding the next chunk would exceed either
+        max_items chunks or max_chars characters of content, so short cases
+        fill a request while long ones don't overflow it.
+        
+        Yields:
+            Lists of chunk dictionaries
+        """
+        batch = []
+        chars = 0
+        while (chunk := await queue.get()) is not _END_OF_STREAM:
+            size = len(chunk['content'])
+            if batch and (len(batch) >= max_items or chars + size > max_chars):
+                yield batch
+                batch = []
+                chars = 0
+            batch.append(chunk)
+            chars += size
+        
+        if batch:
+            yield batch
+    
+    async def _embed_or_split(self, batch: List[Dict]) -> Tuple[List[SearchDoc], List[Tuple[str, str]]]:
+        """
+        Embed a batch, isolating the chunks the model can't take
+        
+        A rate-limited batch is retried whole (halving it doesn't lower the
+        token rate). A context-length 400 is halved down to the offending
+        chunk, which is recorded and skipped; any other 400 is a
+        configuration error and is raised.
+        
+        Returns:
+            (docs, failures): SearchDocs for the embedded chunks, and
+            (chunk_id, error) for those that weren't
+        """
+        for attempt in range(EMBEDDING_RETRIES + 1):
+            try:
+                return await self.embedding_service.embed_chunks_async(batch), []
+            except RateLimitError as e:
+                if attempt == EMBEDDING_RETRIES:
+                    return [], [(chunk['chunk_id'], str(e)) for chunk in batch]
+                await asyncio.sleep(_retry_delay(attempt, e.response))
+            except BadRequestError as e:
+                if not _is_context_length_error(e):
+                    raise
+                if len(batch) == 1:
+                    return [], [(batch[0]['chunk_id'], str(e))]
+                middle = len(batch) // 2
+                first, first_failures = await self._embed_or_split(batch[:middle])
+                second, second_failures = await self._embed_or_split(batch[middle:])
+                return first + second, first_failures + second_failures
+    
+    async def ingest_cases(
         self,
         court: str,
         filed_after: str,
         max_cases: int = 100,
-        dry_run: bool = False
+        dry_run: bool = False,
+        batch_api: bool = False
     ):
         """
         Complete ingestion pipeline
         
+        The four stages (fetch -> chunk -> embed -> upload) run as
+        concurrent workers connected by asyncio queues, so chunks start
+        embedding as soon as the first opinion arrives and documents start
+        uploading as soon as the first embedding batch returns.
+        
         Args:
             court: Court identifier (e.g., 'ca9')
             filed_after: Start date (YYYY-MM-DD)
             max_cases: Maximum cases to ingest
             dry_run: If True, don't upload to Azure
+            batch_api: If True, embed through the Azure OpenAI Batch API
+                (cheaper, but waits for the whole batch to finish)
         """
         print(f"{'='*60}")
         print(f"  Legal Case Ingestion Pipeline")
@@ -89,116 +1211,234 @@ class LegalCaseIngestionPipeline:
         print(f"Filed After:  {filed_after}")
         print(f"Max Cases:    {max_cases}")
         print(f"Dry Run:      {dry_run}")
+        print(f"Batch API:    {batch_api}")
         print(f"{'='*60}\n")
         
         start_time = datetime.now()
         
-        # Step 1: Fetch cases from CourtListener
         print(f"[1/4] Fetching cases from CourtListener API...")
         print(f"      URL: https://www.courtlistener.com/api/rest/v3/opinions/")
+        chunk_workers = os.cpu_count() or 1
         
-        try:
-            opinions = self.courtlistener.fetch_all_opinions_paginated(
-                court=court,
-                filed_after=filed_after,
-                max_cases=max_cases
-            )
-            print(f"      ✓ Fetched {len(opinions)} opinions")
-        except Exception as e:
-            print(f"      ✗ Error: {e}")
-            return None
-        
-        if not opinions:
-            print("      ⚠ No opinions found")
-            return None
-        
-        print()
-        
-        # Step 2: Chunk all cases
         print(f"[2/4] Chunking case text...")
         print(f"      Chunk size: 512 tokens, Overlap: 50 tokens")
+        print(f"      Workers: {chunk_workers} processes")
+        print(f"[3/4] Generating embeddings with Azure OpenAI...")
+        print(f"      Model: {self.embedding_service.deployment_name} "
+              f"({self.index_manager.vector_dimensions} dimensions)")
+        if batch_api:
+            print(f"      Mode: Batch API (polling every {BATCH_POLL_SECONDS}s)")
+        else:
+            print(f"      Batch size: up to {EMBEDDING_BATCH_SIZE} chunks / {EMBEDDING_BATCH_MAX_CHARS:,} chars, "
+                  f"{EMBEDDING_CONCURRENCY} concurrent requests")
+        if dry_run:
+            print(f"[4/4] Skipping upload (dry run mode)")
+        else:
+            print(f"[4/4] Uploading to Azure AI Search...")
+            print(f"      Index: {self.index_manager.index_name}")
+            print(f"      Batch size: {EMBEDDING_BATCH_SIZE} documents (split on 413)")
+        print()
         
-        all_chunks = []
+        fetch_q: asyncio.Queue = asyncio.Queue(maxsize=FETCH_QUEUE_SIZE)
+        chunk_q: asyncio.Queue = asyncio.Queue(maxsize=CHUNK_QUEUE_SIZE)
+        upload_q: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+        
+        total_cases = 0
+        total_chunks = 0
+        total_embedded = 0
         failed_opinions = []
+        failed_chunks = []
+        failed_uploads = []
+        rejected_documents = []
+        upload_stats = {'uploaded': 0, 'failed': 0}
+        
+        fetch_bar = _progress_bar('Fetching', 'case', total=max_cases)
+        chunk_bar = _progress_bar('Chunking', 'case', total=max_cases)
+        embed_bar = _progress_bar('Embedding', 'chunk')
+        upload_bar = _progress_bar('Uploading', 'doc')
+        
+        # Each stage only signals end-of-stream when it finishes cleanly; on
+        # failure the task group cancels the other stages instead, so no
+        # worker is left blocked on a full or empty queue.
+        async def fetch_worker():
+            nonlocal total_cases
+            async for opinion in self.courtlistener.aiter_opinions(court, filed_after, max_cases):
+                total_cases += 1
+                fetch_bar.update()
+                await fetch_q.put(opinion)
+            await fetch_q.put(_END_OF_STREAM)
+            
+            # Fewer opinions than max_cases may exist
+            for bar in (fetch_bar, chunk_bar):
+                bar.total = total_cases
+                bar.refresh()
+        
+        chunk_slots = asyncio.Semaphore(chunk_workers * CHUNK_TASKS_PER_WORKER)
         
-        for i, opinion in enumerate(opinions):
+        async def chunk_one(executor, opinion):
+            nonlocal total_chunks
+            loop = asyncio.get_running_loop()
+            # The slot is held until every chunk is queued, so opinions
+            # blocked on a full chunk_q still count against the limit
             try:
-                chunks = self.chunker.process_opinion(opinion)
-                all_chunks.extend(chunks)
-                
-                case_name = opinion.get('case_name', 'Unknown')
-                print(f"      [{i+1:3d}/{len(opinions)}] {case_name[:50]:<50} → {len(chunks):2d} chunks")
-                
+                chunks = await loop.run_in_executor(executor, _chunk_opinion, opinion)
+                total_chunks += len(chunks)
+                for chunk in chunks:
+                    await chunk_q.put(chunk)
             except Exception as e:
                 failed_opinions.append((opinion.get('id'), str(e)))
-                print(f"      [{i+1:3d}/{len(opinions)}] ✗ Error processing opinion {opinion.get('id')}: {e}")
+            finally:
+                chunk_slots.release()
+                chunk_bar.update()
         
-        print(f"      ✓ Created {len(all_chunks)} total chunks")
-        if failed_opinions:
-            print(f"      ⚠ Failed to process {len(failed_opinions)} opinions")
+        async def chunk_worker():
+            # Chunking is CPU-bound pure Python, so it runs in worker
+            # processes (one chunker each) rather than threads
+            with ProcessPoolExecutor(
+                max_workers=chunk_workers,
+                initializer=_init_chunk_worker,
+                initargs=(self.chunker,)
+            ) as executor:
+                async with asyncio.TaskGroup() as opinions:
+                    while (opinion := await fetch_q.get()) is not _END_OF_STREAM:
+                        await chunk_slots.acquire()
+                        opinions.create_task(chunk_one(executor, opinion))
+            
+            await chunk_q.put(_END_OF_STREAM)
+            if failed_opinions:
+                _report_failures('process opinions:', failed_opinions)
         
-        print()
+        embed_slots = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
         
-        # Step 3: Generate embeddings
-        print(f"[3/4] Generating embeddings with Azure OpenAI...")
-        print(f"      Model: text-embedding-ada-002 (1536 dimensions)")
+        dedup = ChunkDeduplicator()
         
-        try:
-            chunks_with_embeddings = self.embedding_service.embed_chunks(all_chunks)
-            print(f"      ✓ Generated {len(chunks_with_embeddings)} embeddings")
-        except Exception as e:
-            print(f"      ✗ Error: {e}")
-            return None
-        
-        print()
+        async def embed_batch(batch):
+            nonlocal total_embedded
+            # The slot is held until the batch is on upload_q, so batches
+            # blocked on a full queue still count against the limit
+            try:
+                to_embed, reused, repeats = dedup.split(batch)
+                embedded, failures = await self._embed_or_split(to_embed)
+                failed_chunks.extend(failures)
+                copies, orphans = dedup.fan_out(embedded, repeats)
+                failed_chunks.extend((chunk['chunk_id'], _ORPHANED_REPEAT) for chunk in orphans)
+                embedded += copies + reused
+                total_embedded += len(embedded)
+                embed_bar.update(len(batch))
+                if embedded:
+                    await upload_q.put(SearchDoc.to_record_batch(embedded))
+            finally:
+                embed_slots.release()
         
-        # Step 4: Upload to Azure AI Search
-        if dry_run:
-            print(f"[4/4] Skipping upload (dry run mode)")
-            print(f"      Would upload {len(chunks_with_embeddings)} documents")
-        else:
-            print(f"[4/4] Uploading to Azure AI Search...")
-            print(f"      Index: {self.index_manager.index_name}")
-            print(f"      Batch size: 100 documents")
+        async def embed_worker_batch_api():
+            nonlocal total_embedded
+            chunks = []
+            while (chunk := await chunk_q.get()) is not _END_OF_STREAM:
+                chunks.append(chunk)
             
-            # Prepare documents
-            documents = []
-            for chunk in chunks_with_embeddings:
-                doc = {
-                    'id': chunk['chunk_id'],
-                    'case_id': str(chunk['case_id']),
-                    'case_name': chunk['case_name'],
-                    'citation': chunk['citation'],
-                    'court': chunk['court'],
-                    'date_filed': chunk.get('date_filed') or '1900-01-01T00:00:00Z',
-                    'jurisdiction': chunk['jurisdiction'],
-                    'content': chunk['content'],
-                    'content_vector': chunk['content_vector'],
-                    'url': chunk['url'],
-                    'chunk_index': chunk['chunk_index'],
-                    'total_chunks': chunk['total_chunks']
-                }
-                documents.append(doc)
+            if chunks:
+                to_embed, reused, repeats = dedup.split(chunks)
+                embedded, failures = await self.embedding_service.embed_chunks_batch_api(to_embed)
+                failed_chunks.extend(failures)
+                copies, orphans = dedup.fan_out(embedded, repeats)
+                failed_chunks.extend((chunk['chunk_id'], _ORPHANED_REPEAT) for chunk in orphans)
+                embedded += copies + reused
+                total_embedded = len(embedded)
+                embed_bar.update(len(chunks))
+                for i in range(0, len(embedded), EMBEDDING_BATCH_SIZE):
+                    await upload_q.put(SearchDoc.to_record_batch(embedded[i:i + EMBEDDING_BATCH_SIZE]))
+            
+            await upload_q.put(_END_OF_STREAM)
+            if failed_chunks:
+                _report_failures('embed chunks:', failed_chunks)
+        
+        async def embed_worker():
+            async with asyncio.TaskGroup() as batches:
+                async for batch in self._aiter_adaptive_batches(chunk_q):
+                    # Take the slot before spawning, so besides upload_q at
+                    # most EMBEDDING_CONCURRENCY batches are held in memory
+                    await embed_slots.acquire()
+                    batches.create_task(embed_batch(batch))
             
+            await upload_q.put(_END_OF_STREAM)
+            if failed_chunks:
+                _report_failures('embed chunks:', failed_chunks)
+        
+        upload_limit = AdaptiveUploadLimit(initial=2 * self.search_partitions)
+        
+        async def upload_batch(staged):
+            success = False
             try:
-                upload_stats = self.index_manager.upload_documents(documents, batch_size=100)
-                print(f"      ✓ Upload complete")
+                stats = await self.index_manager.upload_batch_async(staged)
+                upload_stats['uploaded'] += stats['uploaded']
+                upload_stats['failed'] += len(stats['failures'])
+                rejected_documents.extend(stats['failures'])
+                success = stats['retries'] == 0
             except Exception as e:
+                failed_uploads.append((staged.column('id')[0].as_py(), str(e)))
+                upload_stats['failed'] += len(staged)
+            finally:
+                await upload_limit.release()
+            await upload_limit.record(success)
+            upload_bar.update(len(staged))
+        
+        async def upload_worker():
+            async with asyncio.TaskGroup() as uploads:
+                while (staged := await upload_q.get()) is not _END_OF_STREAM:
+                    if dry_run:
+                        upload_bar.update(len(staged))
+                        continue
+                    await upload_limit.acquire()
+                    uploads.create_task(upload_batch(staged))
+            
+            if failed_uploads:
+                _report_failures('upload batches (first document id shown):', failed_uploads)
+            if rejected_documents:
+                _report_failures('index documents:', rejected_documents)
+        
+        errors = []
+        try:
+            async with asyncio.TaskGroup() as stages:
+                stages.create_task(fetch_worker())
+                stages.create_task(chunk_worker())
+                stages.create_task(embed_worker_batch_api() if batch_api else embed_worker())
+                stages.create_task(upload_worker())
+        except* Exception as group:
+            errors = _leaf_exceptions(group)
+        finally:
+            for bar in (fetch_bar, chunk_bar, embed_bar, upload_bar):
+                bar.close()
+        
+        if errors:
+            for e in errors:
                 print(f"      ✗ Error: {e}")
-                upload_stats = {'uploaded': 0, 'failed': len(documents)}
+            return None
+        
+        if total_cases == 0:
+            print("      ⚠ No opinions found")
+            return None
         
         print()
+        if dry_run:
+            print(f"Dry run: would upload {total_embedded} documents\n")
         
         # Summary
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
+        attempted = upload_stats['uploaded'] + upload_stats['failed']
+        upload_stats['success_rate'] = upload_stats['uploaded'] / attempted if attempted else 0
+        
         print(f"{'='*60}")
         print(f"  Ingestion Summary")
         print(f"{'='*60}")
-        print(f"Total Cases:         {len(opinions)}")
-        print(f"Total Chunks:        {len(all_chunks)}")
+        print(f"Total Cases:         {total_cases}")
+        print(f"Total Chunks:        {total_chunks}")
         print(f"Failed Processing:   {len(failed_opinions)}")
+        print(f"Failed Embedding:    {len(failed_chunks)}")
+        print(f"Deduplicated:        {dedup.reused}")
+        if self.checkpoint:
+            print(f"From Checkpoint:     {self.checkpoint.hits}")
         
         if not dry_run:
             print(f"Uploaded:            {upload_stats['uploaded']}")
@@ -209,9 +1449,12 @@ class LegalCaseIngestionPipeline:
         print(f"{'='*60}\n")
         
         return {
-            'total_cases': len(opinions),
-            'total_chunks': len(all_chunks),
+            'total_cases': total_cases,
+            'total_chunks': total_chunks,
             'failed_processing': len(failed_opinions),
+            'failed_embedding': len(failed_chunks),
+            'deduplicated_chunks': dedup.reused,
+            'checkpointed_chunks': self.checkpoint.hits if self.checkpoint else 0,
             'duration_seconds': duration,
             **(upload_stats if not dry_run else {'uploaded': 0, 'failed': 0})
         }
@@ -251,12 +1494,62 @@ def main():
         help='Azure AI Search index name (default: legal-cases-index)'
     )
     
+    parser.add_argument(
+        '--embedding-model',
+        type=str,
+        default=os.getenv('RAG_EMBEDDING_MODEL') or EMBEDDING_MODEL,
+        help=f'Azure OpenAI embedding deployment (default: $RAG_EMBEDDING_MODEL or {EMBEDDING_MODEL})'
+    )
+    
+    # A string default goes through type=int; unset or empty means None
+    parser.add_argument(
+        '--embedding-dims',
+        type=int,
+        default=os.getenv('RAG_EMBEDDING_DIMS') or None,
+        help='Truncate embeddings to this size via the API `dimensions` parameter '
+             '(text-embedding-3 only; default: $RAG_EMBEDDING_DIMS, or the model\'s native size)'
+    )
+    
+    parser.add_argument(
+        '--index-dims',
+        type=int,
+        help='Index vector size, for deployments whose native size can\'t be told from '
+             'the name (must equal --embedding-dims if both are given)'
+    )
+    
+    parser.add_argument(
+        '--search-partitions',
+        type=int,
+        default=os.getenv('AZURE_SEARCH_PARTITIONS') or 1,
+        help='Partitions on the search service; sets initial upload concurrency '
+             '(default: $AZURE_SEARCH_PARTITIONS or 1)'
+    )
+    
+    parser.add_argument(
+        '--gzip-uploads',
+        action='store_true',
+        default=os.getenv('AZURE_SEARCH_GZIP', '').lower() in ('1', 'true', 'yes'),
+        help='Send upload bodies with Content-Encoding: gzip (default: off, or $AZURE_SEARCH_GZIP)'
+    )
+    
     parser.add_argument(
         '--setup-index',
         action='store_true',
         help='Create/recreate the search index before ingestion'
     )
     
+    parser.add_argument(
+        '--batch-api',
+        action='store_true',
+        help='Embed through the Azure OpenAI Batch API (~50%% cheaper, up to 24h)'
+    )
+    
+    parser.add_argument(
+        '--checkpoint-db',
+        type=str,
+        help='SQLite file of embedded chunks; rerun with the same file to resume'
+    )
+    
     parser.add_argument(
         '--dry-run',
         action='store_true',
@@ -267,11 +1560,30 @@ def main():
     
     # Validate date format
     try:
-        datetime.strptime(args.date, '%Y-%m-%d')
+        # Normalize any ISO form (e.g. 20240101) to the YYYY-MM-DD the API expects
+        args.date = date.fromisoformat(args.date).isoformat()
     except ValueError:
         print(f"Error: Invalid date format '{args.date}'. Use YYYY-MM-DD")
         sys.exit(1)
     
+    for flag, value in (
+        ('--max-cases', args.max_cases),
+        ('--embedding-dims', args.embedding_dims),
+        ('--index-dims', args.index_dims),
+        ('--search-partitions', args.search_partitions)
+    ):
+        if value is not None and value <= 0:
+            print(f"Error: {flag} must be a positive integer")
+            sys.exit(1)
+    
+    if args.index_dims and args.embedding_dims and args.index_dims != args.embedding_dims:
+        print(f"Error: --index-dims {args.index_dims} doesn't match --embedding-dims {args.embedding_dims}")
+        sys.exit(1)
+    
+    if args.batch_api and not args.checkpoint_db:
+        print("Warning: --batch-api without --checkpoint-db; batches still running if this run "
+              "is interrupted can't be collected later and will be paid for again")
+    
     # Load credentials from environment
     required_env_vars = [
         'COURTLISTENER_API_TOKEN',
@@ -298,7 +1610,13 @@ def main():
             azure_search_api_key=os.getenv('AZURE_SEARCH_API_KEY'),
             azure_openai_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
             azure_openai_api_key=os.getenv('AZURE_OPENAI_API_KEY'),
-            index_name=args.index_name
+            index_name=args.index_name,
+            embedding_model=args.embedding_model,
+            embedding_dims=args.embedding_dims,
+            index_dims=args.index_dims,
+            checkpoint_db=args.checkpoint_db,
+            search_partitions=args.search_partitions,
+            gzip_uploads=args.gzip_uploads
         )
     except Exception as e:
         print(f"Error initializing pipeline: {e}")
@@ -312,24 +1630,48 @@ def main():
             print(f"Error setting up index: {e}")
             sys.exit(1)
     
+    async def run_ingestion():
+        try:
+            return await pipeline.ingest_cases(
+                court=args.court,
+                filed_after=args.date,
+                max_cases=args.max_cases,
+                dry_run=args.dry_run,
+                batch_api=args.batch_api
+            )
+        finally:
+            await pipeline.aclose()
+    
     # Run ingestion
     try:
-        stats = pipeline.ingest_cases(
-            court=args.court,
-            filed_after=args.date,
-            max_cases=args.max_cases,
-            dry_run=args.dry_run
-        )
+        stats = asyncio.run(run_ingestion())
         
-        if stats:
-            print("✓ Ingestion completed successfully")
-            sys.exit(0)
-        else:
+        if not stats:
             print("✗ Ingestion failed")
             sys.exit(1)
+        
+        incomplete = [
+            f"{count} {what}"
+            for count, what in (
+                (stats['failed_processing'], 'opinions could not be chunked'),
+                (stats['failed_embedding'], 'chunks were not embedded'),
+                (stats['failed'], 'documents were not uploaded')
+            )
+            if count
+        ]
+        if incomplete:
+            print(f"✗ Ingestion incomplete: {'; '.join(incomplete)}")
+            sys.exit(1)
+        else:
+            print("✓ Ingestion completed successfully")
+            sys.exit(0)
             
     except KeyboardInterrupt:
         print("\n\n✗ Ingestion interrupted by user")
+        if pipeline.checkpoint:
+            pipeline.checkpoint.close()
+            print(f"  Embedded chunks are saved in {pipeline.checkpoint.path}; "
+                  f"rerun with --checkpoint-db to resume")
         sys.exit(1)
     except Exception as e:
         print(f"\n✗ Ingestion failed: {e}")
@@ -0,0 +1,1431 @@
+"""
+Tests for ingest_cases.py
+
+The pipeline components are replaced by in-memory fakes, so these run
+without CourtListener or Azure credentials. Run from Azuretest/scripts:
+    python -m pytest -q
+"""
+
+import asyncio
+import base64
+import gzip
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import orjson
+import pytest
+from openai import BadRequestError, RateLimitError
+
+import ingest_cases
+from ingest_cases import (
+    AdaptiveUploadLimit,
+    ChunkDeduplicator,
+    EmbeddingCheckpoint,
+    LegalCaseIngestionPipeline,
+    SearchDoc,
+    _END_OF_STREAM,
+    _retry_delay,
+)
+
+
+def make_chunk(chunk_id: str, content: str) -> dict:
+    return {
+        'chunk_id': chunk_id,
+        'case_id': 1,
+        'case_name': 'Smith v. Jones',
+        'citation': '123 F.3d 456',
+        'court': 'ca9',
+        'date_filed': '2024-01-02T00:00:00Z',
+        'jurisdiction': 'US',
+        'url': 'https://www.courtlistener.com/opinion/1/',
+        'content': content,
+        'chunk_index': 0,
+        'total_chunks': 1,
+    }
+
+
+# --- Pipeline fakes ---
+
+class FakeCourtListener(ingest_cases.StreamingCourtListenerClient):
+    """Serves opinions in pages of page_size from an in-memory opinions endpoint"""
+
+    def __init__(self, n_opinions: int, page_size: int = 100):
+        super().__init__('token', http_client=httpx.AsyncClient(transport=httpx.MockTransport(self._handle)))
+        opinions = [{'id': i, 'case_name': f'Case {i}'} for i in range(n_opinions)]
+        self.pages = [opinions[i:i + page_size] for i in range(0, n_opinions, page_size)]
+        self.requested = []
+
+    def _handle(self, request):
+        page = int(request.url.params['page'])
+        self.requested.append(page)
+        results = self.pages[page - 1] if page <= len(self.pages) else []
+        return httpx.Response(200, json={'results': results, 'next': page < len(self.pages) or None})
+
+
+class FakeChunker:
+    """Splits opinion i into chunks_per_opinion chunks; opinions in `bad` raise"""
+
+    def __init__(self, chunks_per_opinion: int = 3, bad=(), courtlistener=None):
+        self.chunks_per_opinion = chunks_per_opinion
+        self.bad = set(bad)
+        # Most opinions fetched ahead of the one being chunked
+        self.courtlistener = courtlistener
+        self.max_lead = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def process_opinion(self, opinion):
+        if self.courtlistener:
+            with self._lock:
+                fetched = sum(len(self.courtlistener.pages[page - 1]) for page in self.courtlistener.requested)
+                self.max_lead = max(self.max_lead, fetched - opinion['id'])
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            time.sleep(0.0002)
+            with self._lock:
+                self.in_flight -= 1
+        if opinion['id'] in self.bad:
+            raise ValueError('no text')
+        return [
+            make_chunk(f"{opinion['id']}-{i}", f"opinion {opinion['id']} part {i}")
+            for i in range(self.chunks_per_opinion)
+        ]
+
+
+def api_error(error_class, status_code: int, message: str, code: str = None):
+    """An openai APIStatusError as the client raises it"""
+    response = httpx.Response(status_code, request=httpx.Request('POST', 'https://openai.example'))
+    return error_class(message, response=response, body={'code': code, 'message': message})
+
+
+class FakeEmbeddingService:
+    deployment_name = 'text-embedding-ada-002'
+
+    def __init__(self, too_long=(), errors=()):
+        self.batches = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # Chunk texts the model rejects as over its context length
+        self.too_long = set(too_long)
+        # Raised by the first len(errors) calls, in order
+        self.errors = list(errors)
+
+    async def embed_chunks_async(self, chunks):
+        self.batches.append(len(chunks))
+        if self.errors:
+            raise self.errors.pop(0)
+        if any(chunk['content'] in self.too_long for chunk in chunks):
+            raise api_error(
+                BadRequestError, 400, "This model's maximum context length is 8192 tokens",
+                code='context_length_exceeded'
+            )
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        return [SearchDoc.from_chunk(chunk, np.full(4, 0.5, dtype=np.float32)) for chunk in chunks]
+
+    async def embed_chunks_batch_api(self, chunks):
+        self.batches.append(len(chunks))
+        return [SearchDoc.from_chunk(chunk, np.full(4, 0.5, dtype=np.float32)) for chunk in chunks], []
+
+
+class FakeIndexManager:
+    index_name = 'legal-cases-index'
+    vector_dimensions = 4
+
+    def __init__(self, rejected=()):
+        # Ids of uploaded documents
+        self.uploaded = []
+        self.batch_sizes = []
+        # Ids the index rejects
+        self.rejected = set(rejected)
+
+    async def upload_batch_async(self, documents):
+        self.batch_sizes.append(len(documents))
+        ids = documents.column('id').to_pylist()
+        self.uploaded.extend(id for id in ids if id not in self.rejected)
+        failures = [(id, 'invalid document') for id in ids if id in self.rejected]
+        return {'uploaded': len(ids) - len(failures), 'failures': failures, 'retries': 0}
+
+
+@pytest.fixture
+def chunk_in_threads(monkeypatch):
+    """Run the chunking pool as threads, so fakes can share state with the test"""
+    monkeypatch.setattr(ingest_cases, 'ProcessPoolExecutor', ThreadPoolExecutor)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ingest_cases, '_retry_delay', lambda attempt, response=None: 0)
+
+
+def make_pipeline(courtlistener=None, chunker=None, embedding_service=None, index_manager=None):
+    pipeline = LegalCaseIngestionPipeline.__new__(LegalCaseIngestionPipeline)
+    pipeline.courtlistener = courtlistener or FakeCourtListener(5)
+    pipeline.chunker = chunker or FakeChunker()
+    pipeline.embedding_service = embedding_service or FakeEmbeddingService()
+    pipeline.index_manager = index_manager or FakeIndexManager()
+    pipeline.checkpoint = None
+    pipeline.search_partitions = 1
+    return pipeline
+
+
+# --- LegalCaseIngestionPipeline ---
+
+def build_pipeline(**kwargs) -> LegalCaseIngestionPipeline:
+    return LegalCaseIngestionPipeline(
+        courtlistener_api_token='token',
+        azure_search_endpoint='https://search.example',
+        azure_search_api_key='key',
+        azure_openai_endpoint='https://openai.example',
+        azure_openai_api_key='key',
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize('kwargs, index_size', [
+    ({}, 1536),
+    ({'embedding_model': 'text-embedding-3-large'}, 3072),
+    ({'embedding_dims': 512}, 512),
+    ({'embedding_model': 'my-deployment', 'index_dims': 256}, 256),
+])
+def test_pipeline_sizes_index_from_dims_or_native_size(kwargs, index_size):
+    pipeline = build_pipeline(**kwargs)
+
+    assert pipeline.index_manager.vector_dimensions == index_size
+    assert pipeline.embedding_service.embedding_dims == kwargs.get('embedding_dims')
+
+
+def test_pipeline_rejects_index_dims_that_differ_from_embedding_dims():
+    with pytest.raises(ValueError, match='--index-dims 256'):
+        build_pipeline(embedding_dims=512, index_dims=256)
+
+
+def test_pipeline_needs_index_dims_for_unknown_deployment():
+    with pytest.raises(ValueError, match='--index-dims'):
+        build_pipeline(embedding_model='my-deployment')
+
+
+# --- LegalCaseIngestionPipeline.ingest_cases ---
+
+def test_pipeline_uploads_every_chunk_once():
+    pipeline = make_pipeline(courtlistener=FakeCourtListener(250))
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=250))
+
+    ids = pipeline.index_manager.uploaded
+    assert sorted(ids) == sorted(f'{i}-{j}' for i in range(250) for j in range(3))
+    assert stats['total_cases'] == 250
+    assert stats['total_chunks'] == 750
+    assert stats['uploaded'] == 750
+    assert stats['failed'] == 0
+
+
+def test_pipeline_fetches_at_most_a_queue_ahead_of_chunking(chunk_in_threads):
+    courtlistener = FakeCourtListener(1000)
+    chunker = FakeChunker(chunks_per_opinion=1, courtlistener=courtlistener)
+    pipeline = make_pipeline(courtlistener=courtlistener, chunker=chunker)
+
+    asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=1000))
+
+    # The queue, plus the page being read and the one just requested
+    # The queue, plus the page being read, the one just requested and the
+    # opinions in the chunking pool
+    assert chunker.max_lead <= ingest_cases.FETCH_QUEUE_SIZE + 2 * 100 + chunker.peak_in_flight
+
+def test_pipeline_holds_a_bounded_number_of_batches_when_uploads_lag(monkeypatch):
+    class LongChunker(FakeChunker):
+        # Five chunks fill an embedding batch by characters
+        def process_opinion(self, opinion):
+            chunks = super().process_opinion(opinion)
+            for chunk in chunks:
+                chunk['content'] += ' ' * (ingest_cases.EMBEDDING_BATCH_MAX_CHARS // 5 - 100)
+            return chunks
+
+    class SlowIndexManager(FakeIndexManager):
+        async def upload_batch_async(self, documents):
+            await asyncio.sleep(0.05)
+            resident.discard(id(documents))
+            return await super().upload_batch_async(documents)
+
+    resident, peak = set(), [0]
+    to_record_batch = SearchDoc.to_record_batch
+
+    def staged(docs):
+        batch = to_record_batch(docs)
+        resident.add(id(batch))
+        peak[0] = max(peak[0], len(resident))
+        return batch
+
+    monkeypatch.setattr(SearchDoc, 'to_record_batch', staticmethod(staged))
+    pipeline = make_pipeline(
+        courtlistener=FakeCourtListener(60), chunker=LongChunker(chunks_per_opinion=5),
+        index_manager=SlowIndexManager()
+    )
+
+    asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=60))
+
+    assert len(pipeline.index_manager.uploaded) == 300
+    # In embedding slots, on upload_q, uploading, and one waiting on the upload gate
+    bound = ingest_cases.EMBEDDING_CONCURRENCY + ingest_cases.UPLOAD_QUEUE_SIZE + 2 * pipeline.search_partitions + 1
+    assert peak[0] <= bound
+
+
+def test_pipeline_bounds_embedding_batches_and_requests():
+    embedding_service = FakeEmbeddingService()
+    pipeline = make_pipeline(
+        courtlistener=FakeCourtListener(1000),
+        embedding_service=embedding_service
+    )
+
+    asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=1000))
+
+    assert sum(embedding_service.batches) == 3000
+    assert max(embedding_service.batches) == ingest_cases.EMBEDDING_BATCH_SIZE
+    assert 1 < embedding_service.peak_in_flight <= ingest_cases.EMBEDDING_CONCURRENCY
+
+
+def test_pipeline_records_opinions_that_fail_to_chunk(capsys):
+    pipeline = make_pipeline(chunker=FakeChunker(bad={1, 3}))
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5))
+
+    assert stats['failed_processing'] == 2
+    assert stats['total_chunks'] == 9
+    assert len(pipeline.index_manager.uploaded) == 9
+    # One report at the end of the phase, not a line as each one fails
+    output = capsys.readouterr().out
+    assert output.count('Failed to process opinions: 2') == 1
+    assert output.count('no text') == 2
+
+
+def test_pipeline_reports_rejected_documents_once(capsys):
+    pipeline = make_pipeline(index_manager=FakeIndexManager(rejected={'1-0', '3-2'}))
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5))
+
+    assert stats['uploaded'] == 13
+    assert stats['failed'] == 2
+    output = capsys.readouterr().out
+    assert output.count('Failed to index documents: 2') == 1
+    assert output.count('invalid document') == 2
+
+
+def test_pipeline_dry_run_uploads_nothing():
+    pipeline = make_pipeline()
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5, dry_run=True))
+
+    assert pipeline.index_manager.uploaded == []
+    assert stats['total_chunks'] == 15
+
+
+def test_pipeline_isolates_chunks_the_model_rejects():
+    embedding_service = FakeEmbeddingService(too_long={'opinion 2 part 1'})
+    pipeline = make_pipeline(embedding_service=embedding_service)
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5))
+
+    assert stats['failed_embedding'] == 1
+    assert '2-1' not in pipeline.index_manager.uploaded
+    assert len(pipeline.index_manager.uploaded) == 14
+
+
+def test_pipeline_retries_rate_limited_batches_whole(no_backoff):
+    embedding_service = FakeEmbeddingService(errors=[api_error(RateLimitError, 429, 'slow down')] * 2)
+    pipeline = make_pipeline(embedding_service=embedding_service)
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5))
+
+    assert stats['failed_embedding'] == 0
+    assert embedding_service.batches == [15, 15, 15]
+    assert len(pipeline.index_manager.uploaded) == 15
+
+
+def test_pipeline_records_chunks_still_rate_limited_after_retries(no_backoff):
+    embedding_service = FakeEmbeddingService(
+        errors=[api_error(RateLimitError, 429, 'slow down')] * (ingest_cases.EMBEDDING_RETRIES + 1)
+    )
+    pipeline = make_pipeline(embedding_service=embedding_service)
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5))
+
+    assert stats['failed_embedding'] == 15
+    assert pipeline.index_manager.uploaded == []
+
+
+def test_pipeline_fails_on_other_bad_requests():
+    embedding_service = FakeEmbeddingService(
+        errors=[api_error(BadRequestError, 400, "'dimensions' is not supported by this model")]
+    )
+    pipeline = make_pipeline(embedding_service=embedding_service)
+
+    assert asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5)) is None
+    assert embedding_service.batches == [15]
+
+
+def test_pipeline_batch_api_mode_embeds_everything_in_one_call():
+    embedding_service = FakeEmbeddingService()
+    index_manager = FakeIndexManager()
+    pipeline = make_pipeline(
+        courtlistener=FakeCourtListener(100),
+        embedding_service=embedding_service,
+        index_manager=index_manager
+    )
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=100, batch_api=True))
+
+    assert embedding_service.batches == [300]
+    assert index_manager.batch_sizes == [ingest_cases.EMBEDDING_BATCH_SIZE, 300 - ingest_cases.EMBEDDING_BATCH_SIZE]
+    assert stats['uploaded'] == 300
+
+
+def test_pipeline_embeds_repeated_chunk_text_once():
+    class BoilerplateChunker(FakeChunker):
+        def process_opinion(self, opinion):
+            chunks = super().process_opinion(opinion)
+            chunks[0]['content'] = 'UNITED STATES COURT OF APPEALS'
+            return chunks
+
+    embedding_service = FakeEmbeddingService()
+    pipeline = make_pipeline(
+        courtlistener=FakeCourtListener(20), chunker=BoilerplateChunker(), embedding_service=embedding_service
+    )
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=20))
+
+    assert len(pipeline.index_manager.uploaded) == 60
+    assert sum(embedding_service.batches) == 41
+    assert stats['deduplicated_chunks'] == 19
+
+
+def test_pipeline_uploads_concurrently_up_to_the_limit():
+    class SlowIndexManager(FakeIndexManager):
+        in_flight = peak_in_flight = 0
+
+        async def upload_batch_async(self, documents):
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            await asyncio.sleep(0.02)
+            self.in_flight -= 1
+            return await super().upload_batch_async(documents)
+
+    index_manager = SlowIndexManager()
+    pipeline = make_pipeline(
+        courtlistener=FakeCourtListener(500), chunker=FakeChunker(chunks_per_opinion=4), index_manager=index_manager
+    )
+
+    asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=500))
+
+    # Starts at two per partition and only grows after a full clean window
+    assert index_manager.peak_in_flight == 2 * pipeline.search_partitions
+
+
+def test_pipeline_records_repeats_of_rejected_chunks_as_failed():
+    class RepeatingChunker(FakeChunker):
+        def process_opinion(self, opinion):
+            chunks = super().process_opinion(opinion)
+            chunks[1]['content'] = chunks[0]['content']
+            return chunks
+
+    embedding_service = FakeEmbeddingService(too_long={'opinion 2 part 0'})
+    pipeline = make_pipeline(chunker=RepeatingChunker(), embedding_service=embedding_service)
+
+    stats = asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5))
+
+    assert stats['failed_embedding'] == 2
+    assert stats['deduplicated_chunks'] == 4
+    assert len(pipeline.index_manager.uploaded) == 13
+
+
+def test_pipeline_returns_none_when_a_stage_fails():
+    class BrokenEmbeddingService(FakeEmbeddingService):
+        async def embed_chunks_async(self, chunks):
+            raise RuntimeError('deployment not found')
+
+    pipeline = make_pipeline(embedding_service=BrokenEmbeddingService())
+
+    assert asyncio.run(pipeline.ingest_cases('ca9', '2024-01-01', max_cases=5)) is None
+
+
+# --- LegalCaseIngestionPipeline._embed_or_split ---
+
+def test_embed_or_split_isolates_chunks_over_the_context_length():
+    embedding_service = FakeEmbeddingService(too_long={'text 2'})
+    pipeline = make_pipeline(embedding_service=embedding_service)
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(4)]
+
+    docs, failures = asyncio.run(pipeline._embed_or_split(chunks))
+
+    assert [d.id for d in docs] == ['0', '1', '3']
+    assert [chunk_id for chunk_id, _ in failures] == ['2']
+    assert embedding_service.batches == [4, 2, 2, 1, 1]
+
+
+def test_embed_or_split_retries_rate_limits_with_the_whole_batch(monkeypatch):
+    delays = []
+    monkeypatch.setattr(ingest_cases, '_retry_delay', lambda attempt, response=None: delays.append(response) or 0)
+    rate_limited = api_error(RateLimitError, 429, 'slow down')
+    embedding_service = FakeEmbeddingService(errors=[rate_limited, rate_limited])
+    pipeline = make_pipeline(embedding_service=embedding_service)
+
+    docs, failures = asyncio.run(pipeline._embed_or_split([make_chunk(str(i), 'text') for i in range(4)]))
+
+    assert len(docs) == 4
+    assert failures == []
+    assert embedding_service.batches == [4, 4, 4]
+    assert delays == [rate_limited.response] * 2
+
+
+def test_embed_or_split_raises_other_bad_requests():
+    embedding_service = FakeEmbeddingService(errors=[api_error(BadRequestError, 400, 'Unknown parameter: dimensions')])
+    pipeline = make_pipeline(embedding_service=embedding_service)
+
+    with pytest.raises(BadRequestError, match='dimensions'):
+        asyncio.run(pipeline._embed_or_split([make_chunk('0', 'text'), make_chunk('1', 'text')]))
+
+    assert embedding_service.batches == [2]
+
+
+# --- SearchDoc ---
+
+def test_search_doc_maps_chunk_onto_index_schema():
+    chunk = make_chunk('c-1', 'text')
+    chunk['date_filed'] = None
+
+    doc = SearchDoc.from_chunk(chunk, np.full(4, 0.5, dtype=np.float32))
+
+    assert doc.id == 'c-1'
+    assert doc.case_id == '1'
+    assert doc.date_filed == ingest_cases.MISSING_DATE_FILED
+
+
+def test_search_docs_stage_as_one_record_batch():
+    docs = [
+        SearchDoc.from_chunk(make_chunk(f'c-{i}', 'text'), np.full(4, i, dtype=np.float32))
+        for i in range(3)
+    ]
+
+    batch = SearchDoc.to_record_batch(docs)
+
+    assert batch.num_rows == 3
+    assert batch.schema.field('content_vector').type.list_size == 4
+    assert batch.column('id').to_pylist() == ['c-0', 'c-1', 'c-2']
+    assert batch.column('content_vector')[2].as_py() == [2.0] * 4
+    assert set(batch.schema.names) == {
+        'id', 'case_id', 'case_name', 'citation', 'court', 'date_filed', 'jurisdiction',
+        'content', 'content_vector', 'url', 'chunk_index', 'total_chunks'
+    }
+
+
+# --- ChunkDeduplicator ---
+
+def make_doc(chunk: dict, value: float = 0.5) -> SearchDoc:
+    return SearchDoc.from_chunk(chunk, np.full(4, value, dtype=np.float32))
+
+
+def test_dedup_sends_one_representative_per_text():
+    dedup = ChunkDeduplicator()
+    chunks = [make_chunk('a', 'same'), make_chunk('b', 'same'), make_chunk('c', 'other')]
+
+    to_embed, reused, repeats = dedup.split(chunks)
+
+    assert [c['chunk_id'] for c in to_embed] == ['a', 'c']
+    assert reused == []
+    assert dedup.reused == 0  # nothing reused until a vector exists
+
+    copies, orphans = dedup.fan_out([make_doc(c) for c in to_embed], repeats)
+
+    assert [d.id for d in copies] == ['b']
+    assert orphans == []
+    assert dedup.reused == 1
+
+
+def test_dedup_reuses_vectors_across_batches():
+    dedup = ChunkDeduplicator()
+    to_embed, _, repeats = dedup.split([make_chunk('a', 'header')])
+    dedup.fan_out([make_doc(to_embed[0], 0.25)], repeats)
+
+    to_embed, reused, _ = dedup.split([make_chunk('b', 'header')])
+
+    assert to_embed == []
+    assert [d.id for d in reused] == ['b']
+    assert reused[0].content_vector[0] == pytest.approx(0.25)
+    assert dedup.reused == 1
+
+
+def test_dedup_returns_repeats_of_failed_representative_as_orphans():
+    dedup = ChunkDeduplicator()
+    _, _, repeats = dedup.split([make_chunk('a', 'same'), make_chunk('b', 'same')])
+
+    copies, orphans = dedup.fan_out([], repeats)
+
+    assert copies == []
+    assert [c['chunk_id'] for c in orphans] == ['b']
+    assert dedup.reused == 0
+
+
+def test_dedup_checks_prefix_on_hash_match(monkeypatch):
+    monkeypatch.setattr(ingest_cases, '_content_hash', lambda content: 42)
+    dedup = ChunkDeduplicator()
+    to_embed, _, repeats = dedup.split([make_chunk('a', 'first text')])
+    dedup.fan_out([make_doc(to_embed[0])], repeats)
+
+    to_embed, reused, _ = dedup.split([make_chunk('b', 'second text')])
+
+    assert [c['chunk_id'] for c in to_embed] == ['b']
+    assert reused == []
+
+
+def test_dedup_evicts_least_recently_used():
+    dedup = ChunkDeduplicator(max_vectors=1)
+    for chunk_id, content in (('a', 'one'), ('b', 'two')):
+        to_embed, _, repeats = dedup.split([make_chunk(chunk_id, content)])
+        dedup.fan_out([make_doc(to_embed[0])], repeats)
+
+    to_embed, reused, _ = dedup.split([make_chunk('c', 'one'), make_chunk('d', 'two')])
+
+    assert [c['chunk_id'] for c in to_embed] == ['c']
+    assert [d.id for d in reused] == ['d']
+
+
+# --- EmbeddingCheckpoint ---
+
+def test_checkpoint_round_trips_rounded_vectors(tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / 'vectors.db'), model='m/4')
+    checkpoint.save({'a': np.array([0.1, -0.0234567, 0.5, 1.0], dtype=np.float32)})
+
+    loaded = checkpoint.load(['a', 'missing'])
+
+    assert list(loaded) == ['a']
+    assert loaded['a'].dtype == np.float32
+    assert np.array_equal(loaded['a'], np.round(loaded['a'], ingest_cases.VECTOR_DECIMALS))
+    assert orjson.dumps(loaded['a'], option=orjson.OPT_SERIALIZE_NUMPY) == b'[0.09998,-0.02345,0.5,1.0]'
+    checkpoint.close()
+
+
+def test_checkpoint_keeps_models_apart(tmp_path):
+    path = str(tmp_path / 'vectors.db')
+    EmbeddingCheckpoint(path, model='small/512').save({'a': np.ones(4, dtype=np.float32)})
+
+    assert EmbeddingCheckpoint(path, model='small/1536').load(['a']) == {}
+    assert list(EmbeddingCheckpoint(path, model='small/512').load(['a'])) == ['a']
+
+
+def test_checkpoint_looks_up_more_ids_than_one_query_holds(tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / 'vectors.db'), model='m/4')
+    ids = [f'chunk-{i}' for i in range(ingest_cases.CHECKPOINT_QUERY_SIZE * 2 + 1)]
+    checkpoint.save({chunk_id: np.ones(4, dtype=np.float32) for chunk_id in ids})
+
+    assert len(checkpoint.load(ids)) == len(ids)
+
+
+def test_checkpoint_tracks_open_batches(tmp_path):
+    path = str(tmp_path / 'vectors.db')
+    checkpoint = EmbeddingCheckpoint(path, model='m/4')
+    checkpoint.add_batch('batch-1')
+    checkpoint.add_batch('batch-2')
+    checkpoint.close_batch('batch-1', 'completed')
+    checkpoint.close()
+
+    assert EmbeddingCheckpoint(path, model='m/4').open_batches() == ['batch-2']
+    assert EmbeddingCheckpoint(path, model='other/4').open_batches() == []
+
+
+# --- Failure reports ---
+
+def test_report_failures_shows_a_few_examples(capsys):
+    ingest_cases._report_failures('embed chunks:', [(f'c-{i}', 'rate limited') for i in range(8)], limit=3)
+
+    assert capsys.readouterr().out.splitlines() == [
+        '      ⚠ Failed to embed chunks: 8',
+        '        - c-0: rate limited',
+        '        - c-1: rate limited',
+        '        - c-2: rate limited',
+        '        ... and 5 more',
+    ]
+
+
+# --- Opinion paging ---
+
+def collect_opinions(courtlistener, max_cases):
+    async def collect():
+        return [o['id'] async for o in courtlistener.aiter_opinions('ca9', '2024-01-01', max_cases)]
+
+    return asyncio.run(collect())
+
+
+def test_opinions_stop_at_max_cases_mid_page():
+    courtlistener = FakeCourtListener(250)
+
+    assert collect_opinions(courtlistener, 150) == list(range(150))
+    assert courtlistener.requested == [1, 2]
+
+
+def test_opinions_stop_at_last_page():
+    courtlistener = FakeCourtListener(120)
+
+    assert collect_opinions(courtlistener, 1000) == list(range(120))
+    assert courtlistener.requested == [1, 2]
+
+
+def test_opinions_without_max_cases_read_every_page():
+    courtlistener = FakeCourtListener(250)
+
+    assert collect_opinions(courtlistener, None) == list(range(250))
+    assert courtlistener.requested == [1, 2, 3]
+
+
+def test_opinions_are_fetched_lazily():
+    courtlistener = FakeCourtListener(250)
+
+    async def first():
+        return await anext(courtlistener.aiter_opinions('ca9', '2024-01-01', None))
+
+    assert asyncio.run(first())['id'] == 0
+    assert courtlistener.requested == [1]
+
+
+def test_opinions_request_sends_filters_and_token():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={'results': [], 'next': None})
+
+    courtlistener = ingest_cases.StreamingCourtListenerClient(
+        'secret', http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    assert collect_opinions(courtlistener, 10) == []
+    assert requests[0].url.params['court'] == 'ca9'
+    assert requests[0].url.params['filed_after'] == '2024-01-01'
+    assert requests[0].headers['authorization'] == 'Token secret'
+
+
+# --- Embedding batches ---
+
+def collect_batches(contents, **limits):
+    async def run():
+        queue = asyncio.Queue()
+        for i, content in enumerate(contents):
+            queue.put_nowait(make_chunk(str(i), content))
+        queue.put_nowait(_END_OF_STREAM)
+        return [
+            [c['content'] for c in batch]
+            async for batch in LegalCaseIngestionPipeline._aiter_adaptive_batches(queue, **limits)
+        ]
+
+    return asyncio.run(run())
+
+
+def test_adaptive_batches_close_at_max_items():
+    assert collect_batches(['a'] * 5, max_chars=100, max_items=2) == [['a', 'a'], ['a', 'a'], ['a']]
+
+
+def test_adaptive_batches_close_before_exceeding_max_chars():
+    batches = collect_batches(['x' * 4, 'x' * 4, 'x' * 4], max_chars=10, max_items=10)
+    assert [len(batch) for batch in batches] == [2, 1]
+
+
+def test_adaptive_batches_send_oversized_chunk_alone():
+    batches = collect_batches(['x' * 50, 'y'], max_chars=10, max_items=10)
+    assert batches == [['x' * 50], ['y']]
+
+
+def test_adaptive_batches_of_nothing():
+    assert collect_batches([]) == []
+
+
+# --- AsyncAzureEmbeddingService ---
+
+class FakeEmbeddings:
+    """Stands in for AsyncAzureOpenAI().embeddings; answers in reverse order"""
+
+    def __init__(self, value=None):
+        self.calls = []
+        # Every component of input i is i, unless a fixed value is given
+        self.value = value
+
+    async def create(self, input, model, **kwargs):
+        self.calls.append({'input': input, 'model': model, **kwargs})
+        data = [
+            types.SimpleNamespace(
+                index=i,
+                embedding=base64.b64encode(
+                    np.full(4, i if self.value is None else self.value, dtype=np.float32).tobytes()
+                ).decode()
+            )
+            for i in range(len(input))
+        ]
+        return types.SimpleNamespace(data=data[::-1])
+
+
+def make_embedding_service(value=None, **kwargs):
+    service = ingest_cases.AsyncAzureEmbeddingService(
+        endpoint='https://openai.example', api_key='key', **kwargs
+    )
+    service.async_client = types.SimpleNamespace(embeddings=FakeEmbeddings(value))
+    return service
+
+
+def test_embed_chunks_async_maps_vectors_by_response_index():
+    service = make_embedding_service()
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(3)]
+
+    embedded = asyncio.run(service.embed_chunks_async(chunks))
+
+    assert [d.id for d in embedded] == ['0', '1', '2']
+    assert [d.content_vector[0] for d in embedded] == [0.0, 1.0, 2.0]
+    assert embedded[0].content_vector.dtype == np.float32
+    call = service.async_client.embeddings.calls[0]
+    assert call['input'] == ['text 0', 'text 1', 'text 2']
+    assert call['encoding_format'] == 'base64'
+    assert call['model'] == ingest_cases.EMBEDDING_MODEL
+
+
+@pytest.mark.parametrize('embedding_dims, sent', [(256, {'dimensions': 256}), (None, {})])
+def test_embed_chunks_async_sends_dimensions_only_when_set(embedding_dims, sent):
+    service = make_embedding_service(embedding_dims=embedding_dims)
+
+    asyncio.run(service.embed_chunks_async([make_chunk('0', 'text')]))
+
+    call = service.async_client.embeddings.calls[0]
+    assert {key: call[key] for key in call if key == 'dimensions'} == sent
+
+
+def test_embed_chunks_async_rounds_vectors_for_upload():
+    service = make_embedding_service(value=-0.0123456789)
+
+    embedded = asyncio.run(service.embed_chunks_async([make_chunk('0', 'text')]))
+
+    vector = embedded[0].content_vector
+    assert vector.dtype == np.float32
+    assert orjson.dumps(vector, option=orjson.OPT_SERIALIZE_NUMPY) == b'[-0.01235,-0.01235,-0.01235,-0.01235]'
+
+
+def test_embed_chunks_async_embeds_only_chunks_missing_from_checkpoint(tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / 'vectors.db'), model='m/4')
+    checkpoint.save({'1': np.full(4, 0.25, dtype=np.float32)})
+    service = make_embedding_service(value=0.5, checkpoint=checkpoint)
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(3)]
+
+    embedded = asyncio.run(service.embed_chunks_async(chunks))
+
+    assert [d.id for d in embedded] == ['0', '1', '2']
+    assert [d.content_vector[0] for d in embedded] == [0.5, 0.25, 0.5]
+    assert service.async_client.embeddings.calls[0]['input'] == ['text 0', 'text 2']
+    assert checkpoint.hits == 1
+    assert set(checkpoint.load(['0', '2'])) == {'0', '2'}
+
+
+def test_embed_chunks_async_skips_the_call_when_everything_is_checkpointed(tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / 'vectors.db'), model='m/4')
+    checkpoint.save({'0': np.full(4, 0.25, dtype=np.float32)})
+    service = make_embedding_service(checkpoint=checkpoint)
+
+    embedded = asyncio.run(service.embed_chunks_async([make_chunk('0', 'text')]))
+
+    assert embedded[0].content_vector[0] == 0.25
+    assert service.async_client.embeddings.calls == []
+
+
+# --- AsyncAzureEmbeddingService.embed_chunks_batch_api ---
+
+def encoded_vector(value: float) -> str:
+    return base64.b64encode(np.full(4, value, dtype=np.float32).tobytes()).decode()
+
+
+class FakeBatchAPI:
+    """
+    Stands in for AsyncAzureOpenAI().files and .batches
+
+    Each batch completes (or ends with final_status) on its first poll;
+    requests whose custom_id is in `fail` come back with a 400.
+    """
+
+    def __init__(self, fail=(), final_status='completed'):
+        self.fail = set(fail)
+        self.final_status = final_status
+        self.stored = {}
+        self.jobs = {}
+        # Requests per submitted batch, and request bodies, in order
+        self.submitted = []
+        self.bodies = []
+        # Local paths of uploaded input files
+        self.uploaded_paths = []
+        self.files = types.SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+
+    def _store(self, content: bytes) -> str:
+        file_id = f'file-{len(self.stored)}'
+        self.stored[file_id] = content
+        return file_id
+
+    async def _create_file(self, file, purpose):
+        self.uploaded_paths.append(getattr(file, 'name', None))
+        return types.SimpleNamespace(id=self._store(file.read()))
+
+    async def _file_content(self, file_id):
+        return types.SimpleNamespace(read=lambda: self.stored[file_id])
+
+    async def _create_batch(self, input_file_id, endpoint, completion_window):
+        output, errors = [], []
+        requests = [orjson.loads(line) for line in self.stored[input_file_id].splitlines()]
+        for request in requests:
+            self.bodies.append(request['body'])
+            if request['custom_id'] in self.fail:
+                errors.append({'custom_id': request['custom_id'], 'response': {
+                    'status_code': 400, 'body': {'error': {'message': 'input too long'}}
+                }})
+            else:
+                output.append({'custom_id': request['custom_id'], 'response': {
+                    'status_code': 200, 'body': {'data': [{'embedding': encoded_vector(0.25)}]}
+                }})
+        self.submitted.append(len(requests))
+        batch_id = f'batch-{len(self.jobs)}'
+        self.jobs[batch_id] = types.SimpleNamespace(
+            id=batch_id,
+            status=self.final_status,
+            output_file_id=self._store(b'\n'.join(orjson.dumps(line) for line in output)),
+            error_file_id=self._store(b'\n'.join(orjson.dumps(line) for line in errors)) if errors else None
+        )
+        return types.SimpleNamespace(id=batch_id, status='validating')
+
+    async def _retrieve(self, batch_id):
+        return self.jobs[batch_id]
+
+
+def make_batch_service(monkeypatch, batch_api, **kwargs):
+    monkeypatch.setattr(ingest_cases, 'BATCH_POLL_SECONDS', 0)
+    service = ingest_cases.AsyncAzureEmbeddingService(
+        endpoint='https://openai.example', api_key='key', **kwargs
+    )
+    service.async_client = batch_api
+    return service
+
+
+def test_batch_api_maps_results_to_chunks(monkeypatch):
+    batch_api = FakeBatchAPI()
+    service = make_batch_service(monkeypatch, batch_api, embedding_dims=256)
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(3)]
+
+    docs, failures = asyncio.run(service.embed_chunks_batch_api(chunks))
+
+    assert [d.id for d in docs] == ['0', '1', '2']
+    assert failures == []
+    assert docs[0].content_vector[0] == pytest.approx(0.25)
+    assert batch_api.submitted == [3]
+    assert batch_api.bodies[0] == {
+        'model': ingest_cases.EMBEDDING_MODEL, 'encoding_format': 'base64', 'dimensions': 256, 'input': 'text 0'
+    }
+
+
+def test_batch_api_reports_chunks_without_a_result(monkeypatch):
+    service = make_batch_service(monkeypatch, FakeBatchAPI(fail={'1'}))
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(3)]
+
+    docs, failures = asyncio.run(service.embed_chunks_batch_api(chunks))
+
+    assert [d.id for d in docs] == ['0', '2']
+    assert failures == [('1', 'input too long')]
+
+
+def test_batch_api_splits_requests_across_files(monkeypatch):
+    batch_api = FakeBatchAPI()
+    service = make_batch_service(monkeypatch, batch_api)
+    monkeypatch.setattr(ingest_cases, 'BATCH_MAX_REQUESTS', 2)
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(5)]
+
+    docs, _ = asyncio.run(service.embed_chunks_batch_api(chunks))
+
+    assert [d.id for d in docs] == ['0', '1', '2', '3', '4']
+    assert sorted(batch_api.submitted) == [1, 2, 2]
+
+
+def test_batch_files_stay_under_the_byte_limit(monkeypatch):
+    service = make_batch_service(monkeypatch, FakeBatchAPI())
+    chunks = [make_chunk(str(i), 'x' * 100) for i in range(5)]
+    line_size = len(service._batch_request(chunks[0]))
+    monkeypatch.setattr(ingest_cases, 'BATCH_MAX_BYTES', 2 * line_size)
+
+    parts = service._split_batch(chunks)
+
+    assert [len(part) for part in parts] == [2, 2, 1]
+
+
+def test_batch_api_removes_its_request_files(monkeypatch):
+    batch_api = FakeBatchAPI()
+    service = make_batch_service(monkeypatch, batch_api)
+    monkeypatch.setattr(ingest_cases, 'BATCH_MAX_REQUESTS', 2)
+
+    asyncio.run(service.embed_chunks_batch_api([make_chunk(str(i), f'text {i}') for i in range(5)]))
+
+    assert len(batch_api.uploaded_paths) == 3
+    assert not any(os.path.exists(path) for path in batch_api.uploaded_paths)
+
+
+def test_batch_api_leaves_no_request_files_when_a_job_fails(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    batch_api = FakeBatchAPI()
+    service = make_batch_service(monkeypatch, batch_api)
+    monkeypatch.setattr(ingest_cases, 'BATCH_MAX_REQUESTS', 2)
+
+    async def refuse(file, purpose):
+        raise httpx.ConnectError('refused')
+
+    batch_api.files.create = refuse
+
+    with pytest.raises(ExceptionGroup):
+        asyncio.run(service.embed_chunks_batch_api([make_chunk(str(i), f'text {i}') for i in range(5)]))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_batch_api_submits_only_chunks_missing_from_checkpoint(monkeypatch, tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / 'vectors.db'), model='m/4')
+    checkpoint.save({'0': np.full(4, 0.5, dtype=np.float32)})
+    batch_api = FakeBatchAPI()
+    service = make_batch_service(monkeypatch, batch_api, checkpoint=checkpoint)
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(3)]
+
+    docs, _ = asyncio.run(service.embed_chunks_batch_api(chunks))
+
+    assert [d.id for d in docs] == ['0', '1', '2']
+    assert batch_api.submitted == [2]
+    assert set(checkpoint.load(['1', '2'])) == {'1', '2'}
+    assert checkpoint.open_batches() == []
+
+
+def test_batch_api_collects_batches_left_open_by_an_interrupted_run(monkeypatch, tmp_path):
+    checkpoint = EmbeddingCheckpoint(str(tmp_path / 'vectors.db'), model='m/4')
+    batch_api = FakeBatchAPI()
+    chunks = [make_chunk(str(i), f'text {i}') for i in range(3)]
+    # A previous run submitted the first two chunks, then stopped
+    requests = b''.join(make_batch_service(monkeypatch, batch_api)._batch_request(chunk) for chunk in chunks[:2])
+    file_id = asyncio.run(batch_api.files.create(file=io.BytesIO(requests), purpose='batch')).id
+    batch = asyncio.run(batch_api.batches.create(
+        input_file_id=file_id, endpoint=ingest_cases.BATCH_EMBEDDINGS_URL, completion_window='24h'
+    ))
+    checkpoint.add_batch(batch.id)
+    service = make_batch_service(monkeypatch, batch_api, checkpoint=checkpoint)
+
+    docs, failures = asyncio.run(service.embed_chunks_batch_api(chunks))
+
+    assert [d.id for d in docs] == ['0', '1', '2']
+    assert failures == []
+    assert batch_api.submitted == [2, 1]
+    assert checkpoint.open_batches() == []
+
+
+def test_batch_api_reports_chunks_of_a_batch_that_did_not_complete(monkeypatch):
+    service = make_batch_service(monkeypatch, FakeBatchAPI(final_status='expired'))
+
+    docs, failures = asyncio.run(service.embed_chunks_batch_api([make_chunk('0', 'text')]))
+
+    assert docs == []
+    assert failures[0][0] == '0'
+    assert 'expired' in failures[0][1]
+
+
+# --- BulkSearchIndexManager.create_index ---
+
+def test_create_index_stores_vectors_as_fp16_with_quantization():
+    index_manager = ingest_cases.BulkSearchIndexManager(
+        endpoint='https://search.example', api_key='key', index_name='idx', vector_dimensions=256
+    )
+    index_manager.index_client = types.SimpleNamespace(create_or_update_index=lambda index: index)
+
+    index = index_manager.create_index()
+
+    vector_field = next(field for field in index.fields if field.name == 'content_vector')
+    assert vector_field.type == 'Collection(Edm.Half)'
+    assert vector_field.vector_search_dimensions == 256
+    profile = index.vector_search.profiles[0]
+    assert profile.compression_name == index.vector_search.compressions[0].compression_name
+
+
+# --- BulkSearchIndexManager.upload_batch_async ---
+
+def make_index_manager(handler, **kwargs) -> ingest_cases.BulkSearchIndexManager:
+    return ingest_cases.BulkSearchIndexManager(
+        endpoint='https://search.example',
+        api_key='key',
+        index_name='idx',
+        vector_dimensions=4,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        **kwargs
+    )
+
+
+def make_docs(n: int):
+    return SearchDoc.to_record_batch([make_doc(make_chunk(f'doc-{i}', f'text {i}')) for i in range(n)])
+
+
+def request_documents(request: httpx.Request) -> list:
+    body = request.read()
+    if request.headers.get('content-encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return orjson.loads(body)['value']
+
+
+def indexed(documents: list, failed=(), throttled=()) -> httpx.Response:
+    """Per-document results: `failed` are rejected (400), `throttled` get a 503"""
+    def result(key):
+        if key in throttled:
+            return {'key': key, 'status': False, 'statusCode': 503, 'errorMessage': 'throttled'}
+        if key in failed:
+            return {'key': key, 'status': False, 'statusCode': 400, 'errorMessage': 'rejected'}
+        return {'key': key, 'status': True, 'statusCode': 201}
+
+    results = [result(d['id']) for d in documents]
+    return httpx.Response(207 if failed or throttled else 200, json={'value': results})
+
+
+def test_retry_delay_honors_retry_after():
+    assert _retry_delay(0, httpx.Response(429, headers={'retry-after': '7'})) == 7.0
+    assert _retry_delay(0, httpx.Response(429, headers={'retry-after': '3600'})) == ingest_cases.RETRY_BACKOFF_MAX
+    assert 1 <= _retry_delay(0, httpx.Response(503)) < 2
+    assert _retry_delay(10) == ingest_cases.RETRY_BACKOFF_MAX
+
+
+@pytest.fixture
+def backoff(monkeypatch):
+    """Record retry delays instead of sleeping through them"""
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(ingest_cases.asyncio, 'sleep', sleep)
+    return delays
+
+
+def test_upload_splits_batch_on_413():
+    sizes = []
+
+    def handler(request):
+        documents = request_documents(request)
+        sizes.append(len(documents))
+        return httpx.Response(413) if len(documents) > 2 else indexed(documents)
+
+    stats = asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(5)))
+
+    assert stats == {'uploaded': 5, 'failures': [], 'retries': 0}
+    assert sizes == [5, 2, 3, 1, 2]
+
+
+def test_upload_sends_documents_in_index_schema():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return indexed(request_documents(request))
+
+    asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(1)))
+
+    assert requests[0].url.path == "/indexes('idx')/docs/search.index"
+    assert requests[0].headers['api-key'] == 'key'
+    document = request_documents(requests[0])[0]
+    assert document['@search.action'] == 'upload'
+    assert document['id'] == 'doc-0'
+    assert document['case_id'] == '1'
+    assert document['content_vector'] == [0.5] * 4
+
+
+def test_upload_gzip_is_opt_in():
+    encodings = []
+
+    def handler(request):
+        encodings.append(request.headers.get('content-encoding'))
+        return indexed(request_documents(request))
+
+    asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(1)))
+    asyncio.run(make_index_manager(handler, gzip_uploads=True).upload_batch_async(make_docs(1)))
+
+    assert encodings == [None, 'gzip']
+
+
+def test_upload_returns_documents_the_service_rejected():
+    index_manager = make_index_manager(lambda request: indexed(request_documents(request), failed={'doc-1'}))
+
+    stats = asyncio.run(index_manager.upload_batch_async(make_docs(3)))
+
+    assert stats == {'uploaded': 2, 'failures': [('doc-1', 'rejected')], 'retries': 0}
+
+
+def test_upload_resends_only_documents_throttled_in_a_multi_status(backoff):
+    sent = []
+    throttled = iter([{'doc-1', 'doc-3'}, {'doc-3'}, set()])
+
+    def handler(request):
+        documents = request_documents(request)
+        sent.append([d['id'] for d in documents])
+        return indexed(documents, failed={'doc-0'}, throttled=next(throttled))
+
+    stats = asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(4)))
+
+    assert sent == [['doc-0', 'doc-1', 'doc-2', 'doc-3'], ['doc-1', 'doc-3'], ['doc-3']]
+    assert stats == {'uploaded': 3, 'failures': [('doc-0', 'rejected')], 'retries': 2}
+    assert len(backoff) == 2
+
+
+def test_upload_counts_documents_still_throttled_after_retries_as_failed(backoff):
+    def handler(request):
+        documents = request_documents(request)
+        return indexed(documents, throttled={'doc-1'})
+
+    stats = asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(2)))
+
+    assert stats == {'uploaded': 1, 'failures': [('doc-1', 'throttled')], 'retries': ingest_cases.SEARCH_UPLOAD_RETRIES}
+
+
+def test_upload_retries_throttled_batches(backoff):
+    responses = iter([httpx.Response(429), httpx.Response(503), None])
+
+    def handler(request):
+        return next(responses) or indexed(request_documents(request))
+
+    stats = asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(2)))
+
+    assert stats == {'uploaded': 2, 'failures': [], 'retries': 2}
+    assert 1 <= backoff[0] < 2 <= backoff[1] < 3
+
+
+def test_upload_retries_server_errors_and_transport_errors(backoff):
+    responses = iter([httpx.ReadTimeout('timed out'), httpx.Response(500), httpx.Response(502), None])
+
+    def handler(request):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response or indexed(request_documents(request))
+
+    stats = asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(2)))
+
+    assert stats == {'uploaded': 2, 'failures': [], 'retries': 3}
+
+
+def test_upload_waits_for_retry_after(backoff):
+    responses = iter([httpx.Response(429, headers={'retry-after': '7'}), None])
+
+    def handler(request):
+        return next(responses) or indexed(request_documents(request))
+
+    asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(1)))
+
+    assert backoff == [7.0]
+
+
+def test_upload_raises_after_last_transport_error(backoff):
+    def handler(request):
+        raise httpx.ConnectError('refused')
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(make_index_manager(handler).upload_batch_async(make_docs(1)))
+
+    assert len(backoff) == ingest_cases.SEARCH_UPLOAD_RETRIES
+
+
+def test_upload_raises_once_retries_run_out(backoff):
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(make_index_manager(lambda request: httpx.Response(503)).upload_batch_async(make_docs(1)))
+
+    assert len(backoff) == ingest_cases.SEARCH_UPLOAD_RETRIES
+    assert max(backoff) <= ingest_cases.RETRY_BACKOFF_MAX
+
+
+# --- AdaptiveUploadLimit ---
+
+def test_upload_limit_grows_after_clean_window():
+    async def run():
+        limit = AdaptiveUploadLimit(initial=2, maximum=3, window=4)
+        for _ in range(4):
+            await limit.record(True)
+        assert limit.limit == 3
+        for _ in range(4):
+            await limit.record(True)
+        assert limit.limit == 3  # capped
+
+    asyncio.run(run())
+
+
+def test_upload_limit_shrinks_when_retries_exceed_five_percent():
+    async def run():
+        limit = AdaptiveUploadLimit(initial=2, maximum=8, window=10)
+        for success in [True] * 9 + [False]:
+            await limit.record(success)
+        assert limit.limit == 1
+        for success in [False] * 10:
+            await limit.record(success)
+        assert limit.limit == 1  # never below one
+
+    asyncio.run(run())
+
+
+def test_upload_limit_holds_size_for_partial_window():
+    async def run():
+        limit = AdaptiveUploadLimit(initial=2, window=50)
+        for _ in range(49):
+            await limit.record(False)
+        assert limit.limit == 2
+
+    asyncio.run(run())
+
+
+def test_upload_limit_blocks_at_limit():
+    async def run():
+        limit = AdaptiveUploadLimit(initial=1)
+        await limit.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limit.acquire(), timeout=0.05)
+        await limit.release()
+        await asyncio.wait_for(limit.acquire(), timeout=0.05)
+
+    asyncio.run(run())
+
+
+# --- main() ---
+
+CREDENTIALS = {
+    'COURTLISTENER_API_TOKEN': 'token',
+    'AZURE_SEARCH_ENDPOINT': 'https://search.example',
+    'AZURE_SEARCH_API_KEY': 'key',
+    'AZURE_OPENAI_ENDPOINT': 'https://openai.example',
+    'AZURE_OPENAI_API_KEY': 'key',
+}
+
+
+class RecordingPipeline:
+    """Stands in for LegalCaseIngestionPipeline and records how main() drives it"""
+
+    stats = {'total_cases': 1, 'failed_processing': 0, 'failed_embedding': 0, 'uploaded': 1, 'failed': 0}
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.ingest_kwargs = None
+        RecordingPipeline.last = self
+
+    def setup_index(self, force_recreate=False):
+        pass
+
+    async def ingest_cases(self, **kwargs):
+        self.ingest_kwargs = kwargs
+        return self.stats
+
+    async def aclose(self):
+        pass
+
+
+def run_main(monkeypatch, *args, env=None, stats=None):
+    """Run main() with the given CLI arguments; returns its exit code"""
+    for var in ('RAG_EMBEDDING_MODEL', 'RAG_EMBEDDING_DIMS', 'AZURE_SEARCH_PARTITIONS', 'AZURE_SEARCH_GZIP'):
+        monkeypatch.delenv(var, raising=False)
+    for var, value in {**CREDENTIALS, **(env or {})}.items():
+        monkeypatch.setenv(var, value)
+    monkeypatch.setattr(ingest_cases, 'LegalCaseIngestionPipeline', RecordingPipeline)
+    monkeypatch.setattr(RecordingPipeline, 'last', None, raising=False)
+    if stats is not None:
+        monkeypatch.setattr(RecordingPipeline, 'stats', stats)
+    monkeypatch.setattr(sys, 'argv', ['ingest_cases.py', '--court', 'ca9', *args])
+    with pytest.raises(SystemExit) as exit_info:
+        ingest_cases.main()
+    return exit_info.value.code
+
+
+def test_main_runs_the_pipeline(monkeypatch):
+    assert run_main(monkeypatch, '--date', '2024-01-01', '--max-cases', '5') == 0
+    assert RecordingPipeline.last.ingest_kwargs['filed_after'] == '2024-01-01'
+    assert RecordingPipeline.last.ingest_kwargs['max_cases'] == 5
+
+
+@pytest.mark.parametrize('given', ['2024-01-01', '20240101'])
+def test_main_normalizes_date(monkeypatch, given):
+    assert run_main(monkeypatch, '--date', given) == 0
+    assert RecordingPipeline.last.ingest_kwargs['filed_after'] == '2024-01-01'
+
+
+@pytest.mark.parametrize('given', ['2024-13-01', '01/02/2024', 'yesterday'])
+def test_main_rejects_invalid_date(monkeypatch, given):
+    assert run_main(monkeypatch, '--date', given) == 1
+    assert RecordingPipeline.last is None
+
+
+@pytest.mark.parametrize('value, partitions', [('3', 3), ('', 1)])
+def test_main_reads_search_partitions_from_env(monkeypatch, value, partitions):
+    assert run_main(monkeypatch, '--date', '2024-01-01', env={'AZURE_SEARCH_PARTITIONS': value}) == 0
+    assert RecordingPipeline.last.kwargs['search_partitions'] == partitions
+
+
+@pytest.mark.parametrize('env, args, gzip_uploads', [
+    ({}, (), False),
+    ({'AZURE_SEARCH_GZIP': 'true'}, (), True),
+    ({}, ('--gzip-uploads',), True),
+])
+def test_main_gzips_uploads_only_when_asked(monkeypatch, env, args, gzip_uploads):
+    assert run_main(monkeypatch, '--date', '2024-01-01', *args, env=env) == 0
+    assert RecordingPipeline.last.kwargs['gzip_uploads'] is gzip_uploads
+
+
+def test_main_reads_embedding_settings_from_env(monkeypatch):
+    env = {'RAG_EMBEDDING_MODEL': 'text-embedding-3-large', 'RAG_EMBEDDING_DIMS': '1024'}
+
+    assert run_main(monkeypatch, '--date', '2024-01-01', env=env) == 0
+    assert RecordingPipeline.last.kwargs['embedding_model'] == 'text-embedding-3-large'
+    assert RecordingPipeline.last.kwargs['embedding_dims'] == 1024
+
+
+def test_main_leaves_dimensions_unset_when_env_is_empty(monkeypatch):
+    assert run_main(monkeypatch, '--date', '2024-01-01', env={'RAG_EMBEDDING_DIMS': ''}) == 0
+    assert RecordingPipeline.last.kwargs['embedding_dims'] is None
+    assert RecordingPipeline.last.kwargs['index_dims'] is None
+
+
+@pytest.mark.parametrize('flag', ['--max-cases', '--embedding-dims', '--index-dims', '--search-partitions'])
+def test_main_rejects_non_positive_sizes(monkeypatch, flag):
+    assert run_main(monkeypatch, '--date', '2024-01-01', flag, '0') == 1
+    assert RecordingPipeline.last is None
+
+
+@pytest.mark.parametrize('args, exit_code', [
+    (('--embedding-dims', '512', '--index-dims', '512'), 0),
+    (('--embedding-dims', '512', '--index-dims', '1536'), 1),
+])
+def test_main_requires_index_dims_to_match_embedding_dims(monkeypatch, args, exit_code):
+    assert run_main(monkeypatch, '--date', '2024-01-01', *args) == exit_code
+
+
+@pytest.mark.parametrize('args, warned', [
+    (('--batch-api',), True),
+    (('--batch-api', '--checkpoint-db', 'vectors.db'), False),
+])
+def test_main_warns_when_batch_api_runs_without_checkpoint(monkeypatch, capsys, args, warned):
+    assert run_main(monkeypatch, '--date', '2024-01-01', *args) == 0
+    assert ('--batch-api without --checkpoint-db' in capsys.readouterr().out) is warned
+
+
+def test_main_fails_when_ingestion_returns_nothing(monkeypatch):
+    assert run_main(monkeypatch, '--date', '2024-01-01', stats={}) == 1
+
+
+@pytest.mark.parametrize('failure', ['failed_processing', 'failed_embedding', 'failed'])
+def test_main_fails_when_anything_was_left_out(monkeypatch, capsys, failure):
+    stats = {**RecordingPipeline.stats, failure: 2}
+
+    assert run_main(monkeypatch, '--date', '2024-01-01', stats=stats) == 1
+    assert 'Ingestion incomplete: 2 ' in capsys.readouterr().out
+
+
+def test_main_requires_credentials(monkeypatch):
+    assert run_main(monkeypatch, '--date', '2024-01-01', env={'AZURE_SEARCH_API_KEY': ''}) == 1
+    assert RecordingPipeline.last is None